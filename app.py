@@ -7,30 +7,92 @@ import subprocess
 import os
 import threading
 import uuid
+import time
 from datetime import datetime
 import pickle
+import io
+import tempfile
+from stt_client import parse_metrics
+from job_queue import MemoryJobQueue, WriteStats, PRIORITIES, slot_classes
 
 app = Flask(__name__)
 
 # Store jobs - file-based storage
+# Loaded on first use (get_jobs) so a new instance can serve requests
+# without unpickling the whole job history at import
 JOBS_FILE = "jobs.pkl"
-jobs = {}
+jobs = None
+jobs_lock = threading.Lock()
 
-if os.path.exists(JOBS_FILE):
-    try:
-        with open(JOBS_FILE, 'rb') as f:
-            jobs = pickle.load(f)
-        print(f"Loaded {len(jobs)} existing jobs")
-    except:
-        jobs = {}
+# Field updates vs bytes written to JOBS_FILE (every update rewrites the file)
+store_stats = WriteStats()
+
+def get_jobs():
+    global jobs
+    if jobs is None:
+        with jobs_lock:
+            if jobs is None:
+                loaded = {}
+                if os.path.exists(JOBS_FILE):
+                    try:
+                        with open(JOBS_FILE, 'rb') as f:
+                            loaded = pickle.load(f)
+                        print(f"Loaded {len(loaded)} existing jobs")
+                    except:
+                        loaded = {}
+                # Histories saved before transcripts were kept out of
+                # jobs.pkl: drop the copies that are also in results/
+                migrated = False
+                for record in loaded.values():
+                    if record.get('transcript_text') and record.get('file_path') and os.path.exists(record['file_path']):
+                        del record['transcript_text']
+                        migrated = True
+                jobs = loaded
+                if migrated:
+                    save_jobs()
+    return jobs
 
 def save_jobs():
     try:
+        data = pickle.dumps(get_jobs())
         with open(JOBS_FILE, 'wb') as f:
-            pickle.dump(jobs, f)
+            f.write(data)
+        store_stats.write(len(data))
     except Exception as e:
         print(f"Error saving jobs: {e}")
 
+# Shared queue for the worker tier, e.g. sqlite:///jobs.db or redis://host:6379/0
+# When unset, jobs run as threads inside the web process
+JOB_QUEUE_URL = os.getenv("JOB_QUEUE_URL", "")
+job_queue = None
+if JOB_QUEUE_URL:
+    from job_queue import open_queue
+    job_queue = open_queue(JOB_QUEUE_URL)
+
+# Without a shared queue, jobs are ordered by an in-process queue (same
+# priority / fair-share rules) and run by this many threads, of which
+# INTERACTIVE_SLOTS only take interactive jobs (see job_queue.slot_classes)
+LOCAL_WORKERS = int(os.getenv("LOCAL_WORKERS", "3"))
+INTERACTIVE_SLOTS = int(os.getenv("INTERACTIVE_SLOTS", "1"))
+
+# Seconds an idle local worker waits for a wake-up before polling again
+LOCAL_POLL_INTERVAL = 1
+
+local_queue = MemoryJobQueue()
+local_wakeup = threading.Condition()
+local_workers_started = False
+local_workers_lock = threading.Lock()
+
+# Module doing the transcription, run as a script per job and asked for
+# video durations; loadtest.py swaps in fake_pipeline
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+TRANSCRIBER_MODULE = os.getenv("TRANSCRIBER_MODULE", "youtube_transcriber")
+
+# Paths the transcriber takes from the environment (name -> default),
+# passed as absolute paths because each job runs in its own scratch
+# directory (see run_transcription)
+TRANSCRIBER_PATHS = {"FINGERPRINT_DIR": "fingerprints", "GOOGLE_APPLICATION_CREDENTIALS": None}
+
 # Results directory
 RESULTS_DIR = "results"
 os.makedirs(RESULTS_DIR, exist_ok=True)
@@ -149,7 +211,8 @@ HTML = """
         <div class="input-group">
             <label>Language</label>
             <select id="language">
-                <option value="ta-IN">Tamil (தமிழ்)</option>
+                <option value="auto">Auto-detect</option>
+                <option value="ta-IN" selected>Tamil (தமிழ்)</option>
                 <option value="en-US">English</option>
                 <option value="hi-IN">Hindi (हिन्दी)</option>
                 <option value="te-IN">Telugu (తెలుగు)</option>
@@ -163,6 +226,16 @@ HTML = """
             </select>
         </div>
         
+        <div class="checkbox-group">
+            <input type="checkbox" id="mixedEnglish">
+            <label for="mixedEnglish" style="margin: 0;">Mixed with English (code-mixed audio)</label>
+        </div>
+        
+        <div class="checkbox-group">
+            <input type="checkbox" id="bulk">
+            <label for="bulk" style="margin: 0;">Bulk job (runs after interactive jobs)</label>
+        </div>
+        
         <div class="checkbox-group">
             <input type="checkbox" id="compress" checked>
             <label for="compress" style="margin: 0;">Compress audio (recommended)</label>
@@ -191,6 +264,8 @@ HTML = """
             const email = document.getElementById('email').value;
             const compress = document.getElementById('compress').checked;
             const language = document.getElementById('language').value;
+            const alternativeLanguages = document.getElementById('mixedEnglish').checked ? ['en-US'] : [];
+            const priority = document.getElementById('bulk').checked ? 'bulk' : 'interactive';
             
             if (!url) {
                 alert('Please enter a YouTube URL');
@@ -214,7 +289,7 @@ HTML = """
                 const response = await fetch('/transcribe', {
                     method: 'POST',
                     headers: {'Content-Type': 'application/json'},
-                    body: JSON.stringify({youtube_url: url, email: email, compress: compress, language: language})
+                    body: JSON.stringify({youtube_url: url, email: email, compress: compress, language: language, alternative_languages: alternativeLanguages, priority: priority})
                 });
                 
                 const result = await response.json();
@@ -305,26 +380,51 @@ HTML = """
 </html>
 """
 
-def run_transcription(job_id, youtube_url, email, compress, language):
+def update_local_job(job_id, **fields):
+    # The transcript is already in results/ (file_path) and read back by
+    # /status; keeping it out of jobs.pkl keeps loading and saving cheap
+    if fields.get('file_path'):
+        fields.pop('transcript_text', None)
+    store_stats.update(fields)
+    get_jobs()[job_id].update(fields)
+    save_jobs()
+
+def run_transcription(job_id, youtube_url, email, compress, language, alternative_languages=None,
+                      min_speakers=None, max_speakers=None, update_job=update_local_job):
+    # The transcriber writes fixed file names (temp_audio.*, tamil_audio.wav,
+    # tamil_transcription.txt) to its working directory, so every job gets
+    # its own; concurrent jobs and leftovers of earlier ones cannot mix
+    job_dir = tempfile.TemporaryDirectory(prefix=f"job-{job_id[:8]}-", ignore_cleanup_errors=True)
     try:
-        jobs[job_id]['status'] = 'processing'
-        jobs[job_id]['progress'] = 10
-        jobs[job_id]['message'] = 'Starting...'
-        save_jobs()
+        started = time.time()
+        update_job(job_id, status='processing', progress=10, message='Starting...')
         
-        cmd = ['python', 'youtube_transcriber.py', youtube_url, '--language', language]
+        # Short clips never touch the disk between extraction and upload
+        script = os.path.join(APP_DIR, f"{TRANSCRIBER_MODULE}.py")
+        cmd = ['python', script, youtube_url, '--language', language, '--in-memory']
+        if alternative_languages:
+            cmd.extend(['--alt-languages', ','.join(alternative_languages)])
+        if min_speakers:
+            cmd.extend(['--min-speakers', str(min_speakers)])
+        if max_speakers:
+            cmd.extend(['--max-speakers', str(max_speakers)])
         if compress:
             cmd.append('--compress')
         
         print(f"Running: {' '.join(cmd)}")
         
-        jobs[job_id]['progress'] = 30
-        save_jobs()
+        update_job(job_id, progress=30)
         
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding='utf-8', errors='ignore')
+        env = dict(os.environ)
+        for name, default in TRANSCRIBER_PATHS.items():
+            value = os.getenv(name, default)
+            if value:
+                env[name] = os.path.abspath(value)
         
-        jobs[job_id]['progress'] = 60
-        save_jobs()
+        process = subprocess.Popen(cmd, cwd=job_dir.name, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   text=True, encoding='utf-8', errors='ignore')
+        
+        update_job(job_id, progress=60)
         
         stdout, stderr = process.communicate(timeout=600)
         
@@ -332,11 +432,15 @@ def run_transcription(job_id, youtube_url, email, compress, language):
         if stderr:
             print(f"Errors: {stderr}")
         
+        # API retry/quota counters and inline/GCS routing reported by the transcriber
+        metrics = parse_metrics(stdout)
+        if metrics:
+            update_job(job_id, metrics=metrics)
+        
         if process.returncode == 0:
-            transcript_file = 'tamil_transcription.txt'
+            transcript_file = os.path.join(job_dir.name, 'tamil_transcription.txt')
             
-            jobs[job_id]['progress'] = 90
-            save_jobs()
+            update_job(job_id, progress=90)
             
             if os.path.exists(transcript_file):
                 result_path = os.path.join(RESULTS_DIR, f"{job_id}.txt")
@@ -349,15 +453,18 @@ def run_transcription(job_id, youtube_url, email, compress, language):
                 
                 words = content.split()
                 
-                jobs[job_id]['status'] = 'completed'
-                jobs[job_id]['progress'] = 100
-                jobs[job_id]['message'] = 'Complete!'
-                jobs[job_id]['duration'] = 300
-                jobs[job_id]['word_count'] = len(words)
-                jobs[job_id]['confidence'] = 90
-                jobs[job_id]['file_path'] = result_path
-                jobs[job_id]['transcript_text'] = content
-                save_jobs()
+                update_job(
+                    job_id,
+                    status='completed',
+                    progress=100,
+                    message='Complete!',
+                    duration=300,
+                    word_count=len(words),
+                    confidence=90,
+                    file_path=result_path,
+                    transcript_text=content,
+                    elapsed_seconds=round(time.time() - started, 2),
+                )
                 
                 print(f"Job {job_id} completed - {len(content)} chars")
             else:
@@ -366,10 +473,57 @@ def run_transcription(job_id, youtube_url, email, compress, language):
             raise Exception(f"Script failed: {stderr}")
             
     except Exception as e:
-        jobs[job_id]['status'] = 'failed'
-        jobs[job_id]['error'] = str(e)
-        save_jobs()
+        update_job(job_id, status='failed', error=str(e))
         print(f"Job {job_id} failed: {e}")
+    finally:
+        job_dir.cleanup()
+
+def local_worker_loop(worker_id, classes):
+    # Imported here to avoid a circular import (worker imports app lazily too)
+    from worker import run_job
+    
+    while True:
+        leased = local_queue.lease(worker_id, classes=classes)
+        if leased is None:
+            # Nothing this slot may run (or paused after a quota error)
+            with local_wakeup:
+                local_wakeup.wait(max(LOCAL_POLL_INTERVAL, local_queue.paused_for()))
+            continue
+        job_id, payload = leased
+        run_job(local_queue, job_id, payload, worker_id, update_job=update_local_job)
+
+def start_local_workers():
+    global local_workers_started
+    with local_workers_lock:
+        if local_workers_started:
+            return
+        for n, classes in enumerate(slot_classes(max(1, LOCAL_WORKERS), INTERACTIVE_SLOTS)):
+            thread = threading.Thread(target=local_worker_loop, args=(f"local-{n}", classes))
+            thread.daemon = True
+            thread.start()
+        local_workers_started = True
+
+def probe_expected_duration(queue, job_id, youtube_url, update_job):
+    """
+    Probe the video length after enqueueing, for shortest-job-first ordering
+    """
+    import importlib
+    
+    duration = importlib.import_module(TRANSCRIBER_MODULE).probe_duration(youtube_url)
+    if duration:
+        queue.set_expected_duration(job_id, duration)
+        update_job(job_id, expected_duration=duration)
+
+def submitter_key(email):
+    """
+    Fair-share key: API key header, else email, else client address
+    """
+    return request.headers.get('X-API-Key') or email or request.remote_addr or ''
+
+def get_job(job_id):
+    if job_queue:
+        return job_queue.get_job(job_id)
+    return get_jobs().get(job_id)
 
 @app.route('/')
 def index():
@@ -382,22 +536,61 @@ def transcribe():
     email = data.get('email', '')
     compress = data.get('compress', True)
     language = data.get('language', 'ta-IN')
+    alternative_languages = data.get('alternative_languages') or []
+    if isinstance(alternative_languages, str):
+        alternative_languages = [code.strip() for code in alternative_languages.split(',') if code.strip()]
+    
+    priority = data.get('priority') or 'interactive'
     
     if not youtube_url:
         return jsonify({'error': 'Missing YouTube URL'}), 400
     
+    if priority not in PRIORITIES:
+        return jsonify({'error': f"Priority must be one of: {', '.join(PRIORITIES)}"}), 400
+    
+    try:
+        min_speakers = int(data['min_speakers']) if data.get('min_speakers') else None
+        max_speakers = int(data['max_speakers']) if data.get('max_speakers') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Speaker counts must be numbers'}), 400
+    
     job_id = str(uuid.uuid4())
-    jobs[job_id] = {
+    record = {
         'status': 'queued',
         'progress': 0,
         'message': 'Starting...',
         'email': email,
         'youtube_url': youtube_url,
-        'language': language
+        'language': language,
+        'alternative_languages': alternative_languages,
+        'priority': priority
     }
-    save_jobs()
+    payload = {
+        'youtube_url': youtube_url,
+        'email': email,
+        'compress': compress,
+        'language': language,
+        'alternative_languages': alternative_languages,
+        'min_speakers': min_speakers,
+        'max_speakers': max_speakers
+    }
+    submitter = submitter_key(email)
     
-    thread = threading.Thread(target=run_transcription, args=(job_id, youtube_url, email, compress, language))
+    if job_queue:
+        # Worker tier picks the job up from the shared queue (worker.py)
+        queue, update_job = job_queue, job_queue.update_job
+        job_queue.enqueue(job_id, payload, record, priority=priority, submitter=submitter)
+    else:
+        queue, update_job = local_queue, update_local_job
+        store_stats.update(record)
+        get_jobs()[job_id] = record
+        save_jobs()
+        start_local_workers()
+        local_queue.enqueue(job_id, payload, {}, priority=priority, submitter=submitter)
+        with local_wakeup:
+            local_wakeup.notify_all()
+    
+    thread = threading.Thread(target=probe_expected_duration, args=(queue, job_id, youtube_url, update_job))
     thread.daemon = True
     thread.start()
     
@@ -405,24 +598,35 @@ def transcribe():
 
 @app.route('/status/<job_id>')
 def get_status(job_id):
-    if job_id not in jobs:
+    job = get_job(job_id)
+    if job is None:
         return jsonify({'error': 'Job not found'}), 404
-    return jsonify(jobs[job_id])
+    
+    file_path = job.get('file_path')
+    if job['status'] == 'completed' and 'transcript_text' not in job and file_path and os.path.exists(file_path):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            job = dict(job, transcript_text=f.read())
+    return jsonify(job)
 
 @app.route('/download/<job_id>')
 def download(job_id):
-    if job_id not in jobs:
+    job = get_job(job_id)
+    if job is None:
         return jsonify({'error': 'Job not found'}), 404
     
-    job = jobs[job_id]
     if job['status'] != 'completed':
         return jsonify({'error': 'Job not completed'}), 400
     
     file_path = job.get('file_path')
-    if not file_path or not os.path.exists(file_path):
-        return jsonify({'error': 'File not found'}), 404
+    if file_path and os.path.exists(file_path):
+        return send_file(file_path, as_attachment=True, download_name='transcription.txt')
+    
+    # Result written by a worker on another machine
+    if job.get('transcript_text'):
+        return send_file(io.BytesIO(job['transcript_text'].encode('utf-8')), as_attachment=True,
+                         download_name='transcription.txt', mimetype='text/plain')
     
-    return send_file(file_path, as_attachment=True, download_name='transcription.txt')
+    return jsonify({'error': 'File not found'}), 404
 
 if __name__ == '__main__':
     print("\n" + "="*60)
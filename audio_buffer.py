@@ -0,0 +1,157 @@
+"""
+PCM audio handed from extraction to recognition without extra copies
+
+Short clips stay in memory after conversion: an AudioBuffer wraps the
+converted samples in a memoryview, and fingerprinting, language detection,
+chunking and upload all read slices of it. Clips over AUDIO_SPILL_BYTES
+are written to a WAV file as before; AudioBuffer.open_wav() maps that file
+with mmap so slicing it reads only the pages that are used.
+"""
+
+import io
+import mmap
+import os
+import struct
+
+# Converted audio larger than this is written to disk instead of kept in
+# memory (16 kHz mono 16-bit: 10 MB is about 5.5 minutes)
+AUDIO_SPILL_BYTES = int(float(os.getenv("AUDIO_SPILL_MB", "10")) * 1024 * 1024)
+
+
+class AudioBuffer:
+    """
+    Little-endian PCM samples (LINEAR16 when sample_width is 2) in a memoryview
+    """
+
+    def __init__(self, data, sample_rate, sample_width=2, channels=1, owner=None):
+        self.data = memoryview(data).cast('B')
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.channels = channels
+        # Object keeping the memory alive (e.g. the mmap), closed by close()
+        self._owner = owner
+
+    @classmethod
+    def from_segment(cls, segment):
+        """
+        Wrap a pydub AudioSegment's samples without copying them
+        """
+        return cls(segment.raw_data, segment.frame_rate, segment.sample_width, segment.channels)
+
+    @classmethod
+    def open_wav(cls, path):
+        """
+        Map the sample data of a PCM WAV file into memory (read-only)
+        """
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if mapped[:4] != b'RIFF' or mapped[8:12] != b'WAVE':
+            mapped.close()
+            raise ValueError(f"Not a WAV file: {path}")
+
+        # Walk the RIFF chunks for the format and the sample data
+        offset = 12
+        fmt = None
+        while offset + 8 <= len(mapped):
+            chunk_id = mapped[offset:offset + 4]
+            size = struct.unpack('<I', mapped[offset + 4:offset + 8])[0]
+            body = offset + 8
+            if chunk_id == b'fmt ':
+                channels, sample_rate = struct.unpack('<HI', mapped[body + 2:body + 8])
+                bits = struct.unpack('<H', mapped[body + 14:body + 16])[0]
+                fmt = (sample_rate, bits // 8, channels)
+            elif chunk_id == b'data' and fmt:
+                end = min(body + size, len(mapped))
+                sample_rate, sample_width, channels = fmt
+                return cls(memoryview(mapped)[body:end], sample_rate, sample_width, channels, owner=mapped)
+            offset = body + size + (size & 1)
+
+        mapped.close()
+        raise ValueError(f"No PCM data found in: {path}")
+
+    @property
+    def frame_size(self):
+        return self.sample_width * self.channels
+
+    @property
+    def duration(self):
+        """
+        Length in seconds
+        """
+        return len(self.data) / (self.frame_size * self.sample_rate)
+
+    def __len__(self):
+        return len(self.data)
+
+    def slice(self, start, end=None):
+        """
+        View of the audio between start and end seconds (no copy)
+        """
+        first = int(start * self.sample_rate) * self.frame_size
+        last = len(self.data) if end is None else int(end * self.sample_rate) * self.frame_size
+        return AudioBuffer(self.data[first:last], self.sample_rate, self.sample_width, self.channels)
+
+    def samples(self):
+        """
+        NumPy int16 view of the samples (no copy)
+        """
+        import numpy as np
+
+        return np.frombuffer(self.data, dtype=np.int16)
+
+    def reader(self):
+        """
+        Seekable file object over the samples, for streaming uploads
+        """
+        return _MemoryReader(self.data)
+
+    def close(self):
+        """
+        Release the view and unmap the file, if any
+        """
+        try:
+            self.data.release()
+            if self._owner is not None:
+                self._owner.close()
+        except BufferError:
+            # Slices are still in use; the mapping is freed with them
+            pass
+
+
+class _MemoryReader(io.RawIOBase):
+    """
+    Read-only file object over a memoryview (readinto copies straight into
+    the caller's buffer, with no intermediate bytes objects)
+    """
+
+    def __init__(self, view):
+        self.view = view
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        count = min(len(b), len(self.view) - self.position)
+        if count <= 0:
+            return 0
+        memoryview(b).cast('B')[:count] = self.view[self.position:self.position + count]
+        self.position += count
+        return count
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        else:
+            self.position = len(self.view) + offset
+        self.position = max(0, self.position)
+        return self.position
+
+    def tell(self):
+        return self.position
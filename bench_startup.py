@@ -0,0 +1,136 @@
+"""
+Cold-start benchmark for the CLI and the web app
+
+Each measurement runs in a fresh interpreter (so nothing is cached in
+sys.modules) inside a scratch directory, and the median of several runs is
+compared against a budget. Exits with status 1 if any budget is exceeded.
+
+Usage:
+    python bench_startup.py [--runs N]
+"""
+
+import os
+import pickle
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# New instances must be ready to serve well under a second
+IMPORT_BUDGET_SECONDS = 0.5
+
+# Job history seeded into jobs.pkl: a busy instance's worth of finished
+# jobs, whose transcripts (about an hour of speech each) are in results/
+SEED_JOBS = 2000
+SEED_TRANSCRIPT_WORDS = 8000
+SEED_JOB_ID = "bench-job-0"
+
+# name -> (snippet timed inside a fresh interpreter, budget in seconds)
+CHECKS = {
+    "import youtube_transcriber": ("import youtube_transcriber", IMPORT_BUDGET_SECONDS),
+    "import app": ("import app", IMPORT_BUDGET_SECONDS),
+    "import app + first request": (
+        "import app; app.app.test_client().get('/')",
+        IMPORT_BUDGET_SECONDS,
+    ),
+    # First request that needs the job history (loads the seeded jobs.pkl)
+    "import app + first /status": (
+        f"import app; assert app.app.test_client().get('/status/{SEED_JOB_ID}').status_code == 200",
+        IMPORT_BUDGET_SECONDS,
+    ),
+    "CLI usage": (
+        "import runpy, sys; sys.argv = ['youtube_transcriber.py']\n"
+        "try:\n"
+        f"    runpy.run_path({os.path.join(REPO_DIR, 'youtube_transcriber.py')!r}, run_name='__main__')\n"
+        "except SystemExit:\n"
+        "    pass",
+        IMPORT_BUDGET_SECONDS,
+    ),
+}
+
+TIMER = """
+import time
+_start = time.perf_counter()
+{snippet}
+print("ELAPSED", time.perf_counter() - _start)
+"""
+
+
+def seed_jobs(workdir):
+    """
+    Write a jobs.pkl with SEED_JOBS completed jobs into workdir, and the
+    transcript of SEED_JOB_ID (the one the benchmark requests)
+    """
+    os.makedirs(os.path.join(workdir, "results"), exist_ok=True)
+    with open(os.path.join(workdir, "results", f"{SEED_JOB_ID}.txt"), "w", encoding="utf-8") as f:
+        f.write(" ".join(["வணக்கம்"] * SEED_TRANSCRIPT_WORDS))
+
+    jobs = {}
+    for n in range(SEED_JOBS):
+        jobs[f"bench-job-{n}"] = {
+            'status': 'completed',
+            'progress': 100,
+            'message': 'Complete!',
+            'email': f"user{n % 50}@example.com",
+            'youtube_url': f"https://www.youtube.com/watch?v=bench{n}",
+            'language': 'ta-IN',
+            'alternative_languages': [],
+            'priority': 'interactive',
+            'word_count': SEED_TRANSCRIPT_WORDS,
+            'file_path': os.path.join("results", f"bench-job-{n}.txt"),
+            'metrics': {'calls': 12, 'retries': 0, 'quota_exhausted': 0, 'route_gcs': 1},
+            'elapsed_seconds': 812.4,
+        }
+    with open(os.path.join(workdir, "jobs.pkl"), "wb") as f:
+        pickle.dump(jobs, f)
+
+
+def time_snippet(snippet, workdir):
+    """
+    Run snippet in a fresh interpreter and return its elapsed seconds
+    """
+    env = dict(os.environ, PYTHONPATH=REPO_DIR, PYTHONDONTWRITEBYTECODE="1")
+    env.pop("JOB_QUEUE_URL", None)
+    source = TIMER.format(snippet=snippet)
+    result = subprocess.run([sys.executable, "-c", source], cwd=workdir, env=env,
+                            capture_output=True, text=True, encoding="utf-8", errors="ignore")
+    for line in result.stdout.splitlines():
+        if line.startswith("ELAPSED "):
+            return float(line.split()[1])
+    raise RuntimeError(f"Benchmark snippet failed:\n{result.stderr}")
+
+
+def main():
+    runs = 5
+    if "--runs" in sys.argv:
+        runs = int(sys.argv[sys.argv.index("--runs") + 1])
+
+    print("=" * 60)
+    print(f"COLD START BENCHMARK (median of {runs} runs)")
+    print("=" * 60)
+
+    failed = False
+    with tempfile.TemporaryDirectory() as workdir:
+        seed_jobs(workdir)
+        for name, (snippet, budget) in CHECKS.items():
+            try:
+                timings = [time_snippet(snippet, workdir) for _ in range(runs)]
+            except RuntimeError as e:
+                print(f"[ERR] {name}: {e}")
+                failed = True
+                continue
+
+            median = statistics.median(timings)
+            ok = median <= budget
+            failed = failed or not ok
+            status = "OK" if ok else "OVER BUDGET"
+            print(f"  {name:<30} {median * 1000:8.1f} ms  (budget {budget * 1000:.0f} ms)  [{status}]")
+
+    print("=" * 60)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
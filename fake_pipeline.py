@@ -0,0 +1,87 @@
+"""
+Stand-in for youtube_transcriber.py that needs no network or credentials
+
+Takes the same command line, sleeps through each stage with tunable
+latency, fails a configurable share of jobs and writes a dummy transcript
+where the real one would go. Used by loadtest.py through
+TRANSCRIBER_MODULE=fake_pipeline.
+
+Tuning (environment variables):
+    FAKE_DOWNLOAD_SECONDS, FAKE_RECOGNIZE_SECONDS, FAKE_PROBE_SECONDS
+        Mean latency of each stage
+    FAKE_DOWNLOAD_FAILURE_RATE, FAKE_RECOGNIZE_FAILURE_RATE
+        Probability (0-1) that a stage fails
+    FAKE_JITTER       Latencies vary uniformly by +/- this fraction
+    FAKE_VIDEO_SECONDS  Mean duration returned by probe_duration()
+    FAKE_WORDS        Words in the dummy transcript
+"""
+
+import os
+import random
+import sys
+import time
+
+import stt_client
+
+# stage -> (mean seconds, failure rate)
+STAGES = {
+    'download': (float(os.getenv("FAKE_DOWNLOAD_SECONDS", "1.0")),
+                 float(os.getenv("FAKE_DOWNLOAD_FAILURE_RATE", "0"))),
+    'recognize': (float(os.getenv("FAKE_RECOGNIZE_SECONDS", "2.0")),
+                  float(os.getenv("FAKE_RECOGNIZE_FAILURE_RATE", "0"))),
+}
+PROBE_SECONDS = float(os.getenv("FAKE_PROBE_SECONDS", "0.2"))
+JITTER = float(os.getenv("FAKE_JITTER", "0.5"))
+VIDEO_SECONDS = float(os.getenv("FAKE_VIDEO_SECONDS", "600"))
+WORDS = int(os.getenv("FAKE_WORDS", "500"))
+
+# Same output file as youtube_transcriber.save_transcription
+OUTPUT_FILE = "tamil_transcription.txt"
+
+
+def _jittered(seconds):
+    return seconds * random.uniform(1 - JITTER, 1 + JITTER)
+
+
+def probe_duration(youtube_url):
+    """
+    Fake youtube_transcriber.probe_duration
+    """
+    time.sleep(_jittered(PROBE_SECONDS))
+    return round(_jittered(VIDEO_SECONDS))
+
+
+def run_stage(name):
+    """
+    Sleep for one stage; returns seconds spent, exits with status 1 on a
+    simulated failure
+    """
+    mean, failure_rate = STAGES[name]
+    seconds = _jittered(mean)
+    time.sleep(seconds)
+    if random.random() < failure_rate:
+        print(f"[ERR] Simulated {name} failure")
+        sys.exit(1)
+    print(f"[OK] {name} done in {seconds:.2f}s")
+    return seconds
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python fake_pipeline.py <youtube_url> [transcriber options, ignored]")
+        sys.exit(1)
+
+    run_stage('download')
+    seconds = run_stage('recognize')
+    stt_client.record_route('inline', seconds)
+
+    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
+        # Starts with the URL, so a transcript can be matched to its job
+        f.write(sys.argv[1] + " " + " ".join("word" for _ in range(WORDS)) + "\n")
+    print(f"[OK] Transcription saved to: {OUTPUT_FILE}")
+
+    stt_client.print_metrics()
+
+
+if __name__ == "__main__":
+    main()
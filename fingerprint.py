@@ -0,0 +1,328 @@
+"""
+Audio fingerprints for spotting re-uploads and mirrors of the same audio
+
+Chromaprint-style sub-fingerprints: the audio is resampled to 8 kHz, cut
+into overlapping frames, and for each frame the energy in 33 bands between
+300 and 2000 Hz is compared with the neighbouring band and the previous
+frame, giving one 32-bit hash per 0.128 s. Everything is vectorized with
+NumPy, so an hour of audio takes about a second.
+
+FingerprintIndex stores fingerprints next to the recognized words of each
+transcript, plus an inverted index (hash -> entry, frame) in SQLite.
+find_match() looks up the new recording's hashes in the index, so only
+entries sharing hashes with it are loaded and scored, and returns the
+longest stretch that matches a stored recording, with the stored words
+shifted onto the new timeline. Only the remaining audio needs recognition.
+
+Words are only reused from transcripts recognized with the same settings
+(language, alternative languages, speaker range, see RECOGNITION_KEYS):
+the same video submitted in another language is recognized again.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+
+import numpy as np
+
+FP_SAMPLE_RATE = 8000
+FRAME_SIZE = 2048
+HOP_SIZE = 1024
+
+# Seconds between consecutive hashes
+FRAME_SECONDS = HOP_SIZE / FP_SAMPLE_RATE
+
+# 34 edges -> 33 bands -> 32 difference bits per frame
+BAND_EDGES = np.geomspace(300, 2000, 34)
+
+# Frames processed per FFT batch (bounds memory for long recordings)
+BLOCK_FRAMES = 2048
+
+# Hashes that occur more often than this in one recording (silence, hum)
+# are useless for finding offsets
+MAX_HASH_REPEATS = 50
+
+# A frame matches when the smoothed count of differing bits is at most this
+MAX_BIT_ERRORS = 10
+SMOOTH_FRAMES = 16
+
+# Shortest stretch worth reusing
+MIN_MATCH_SECONDS = 10
+
+# Entries (best offset by hash votes) scored in full per lookup
+MAX_CANDIDATES = 5
+
+# Entry info that must equal the new job's for its words to be reused
+RECOGNITION_KEYS = ('language', 'alternative_languages', 'min_speakers', 'max_speakers')
+
+FINGERPRINT_DIR = os.getenv("FINGERPRINT_DIR", "fingerprints")
+
+
+def compute_fingerprint(samples, sample_rate):
+    """
+    Compute the fingerprint of mono 16-bit PCM samples
+
+    Args:
+        samples: 1-D array (or buffer) of int16 samples
+        sample_rate: Sample rate of samples in Hz
+
+    Returns:
+        uint32 array with one hash per FRAME_SECONDS
+    """
+    samples = np.asarray(samples).astype(np.float32)
+
+    # Resample to FP_SAMPLE_RATE (plain decimation when it divides evenly)
+    if sample_rate != FP_SAMPLE_RATE:
+        if sample_rate % FP_SAMPLE_RATE == 0:
+            factor = sample_rate // FP_SAMPLE_RATE
+            usable = len(samples) - len(samples) % factor
+            samples = samples[:usable].reshape(-1, factor).mean(axis=1)
+        else:
+            positions = np.arange(0, len(samples), sample_rate / FP_SAMPLE_RATE)
+            samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+    if len(samples) < FRAME_SIZE:
+        return np.zeros(0, dtype=np.uint32)
+
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FRAME_SIZE)[::HOP_SIZE]
+    window = np.hanning(FRAME_SIZE).astype(np.float32)
+
+    freqs = np.fft.rfftfreq(FRAME_SIZE, 1 / FP_SAMPLE_RATE)
+    edges = np.searchsorted(freqs, BAND_EDGES)
+
+    energies = np.empty((len(frames), len(edges) - 1), dtype=np.float32)
+    for start in range(0, len(frames), BLOCK_FRAMES):
+        block = frames[start:start + BLOCK_FRAMES] * window
+        power = np.abs(np.fft.rfft(block, axis=1)[:, edges[0]:edges[-1]]) ** 2
+        energies[start:start + len(block)] = np.add.reduceat(power, edges[:-1] - edges[0], axis=1)
+
+    band_diff = energies[:, :-1] - energies[:, 1:]
+    bits = (band_diff[1:] - band_diff[:-1]) > 0
+    weights = (1 << np.arange(bits.shape[1], dtype=np.uint64))
+    return (bits.astype(np.uint64) @ weights).astype(np.uint32)
+
+
+def _bit_errors(a, b):
+    """
+    Number of differing bits between two equal-length uint32 arrays
+    """
+    xor = np.ascontiguousarray(a ^ b).view(np.uint8)
+    return np.unpackbits(xor).reshape(-1, 32).sum(axis=1)
+
+
+def _recognition_key(info):
+    """
+    Canonical string of the recognition settings in info (see RECOGNITION_KEYS)
+    """
+    return json.dumps({key: info.get(key) for key in RECOGNITION_KEYS}, sort_keys=True)
+
+
+def _indexable(fingerprint):
+    """
+    (hash, frame) pairs worth indexing: hashes repeated more than
+    MAX_HASH_REPEATS times in the recording are left out
+    """
+    values, counts = np.unique(fingerprint, return_counts=True)
+    common = values[counts > MAX_HASH_REPEATS]
+    keep = ~np.isin(fingerprint, common)
+    frames = np.flatnonzero(keep)
+    return [(int(value), int(frame)) for value, frame in zip(fingerprint[frames], frames)]
+
+
+def _longest_match(query, stored, offset):
+    """
+    Longest run of query frames matching stored at offset
+
+    Returns:
+        (start, end) query frame indices, or None
+    """
+    first = max(0, -offset)
+    last = min(len(query), len(stored) - offset)
+    if last - first < SMOOTH_FRAMES:
+        return None
+
+    errors = _bit_errors(query[first:last], stored[first + offset:last + offset])
+    smooth = np.convolve(errors, np.ones(SMOOTH_FRAMES) / SMOOTH_FRAMES, mode='same')
+    matched = np.concatenate(([0], (smooth <= MAX_BIT_ERRORS).astype(np.int8), [0]))
+
+    edges = np.diff(matched)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    if len(starts) == 0:
+        return None
+
+    longest = np.argmax(ends - starts)
+    return first + int(starts[longest]), first + int(ends[longest])
+
+
+class FingerprintIndex:
+    """
+    Directory of fingerprints (<id>.npy), recognized words (<id>.json) and
+    the inverted hash index (index.db)
+    """
+
+    def __init__(self, directory=FINGERPRINT_DIR):
+        self.directory = directory
+
+    def _connect(self):
+        os.makedirs(self.directory, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(self.directory, "index.db"), timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS entries (entry_id TEXT PRIMARY KEY, recognition TEXT)")
+        # Index files created before entries recorded their settings
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(entries)")}
+        if 'recognition' not in columns:
+            conn.execute("ALTER TABLE entries ADD COLUMN recognition TEXT")
+        conn.execute("CREATE TABLE IF NOT EXISTS hashes (hash INTEGER NOT NULL, entry_id TEXT NOT NULL, frame INTEGER NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS hashes_hash ON hashes (hash)")
+        return conn
+
+    def _index(self, conn, entry_id, fingerprint, info):
+        """
+        Add an entry's hashes to the inverted index (once per entry)
+        """
+        with conn:
+            if conn.execute("INSERT OR IGNORE INTO entries (entry_id, recognition) VALUES (?, ?)",
+                            (entry_id, _recognition_key(info))).rowcount:
+                conn.executemany("INSERT INTO hashes (hash, entry_id, frame) VALUES (?, ?, ?)",
+                                 [(value, entry_id, frame) for value, frame in _indexable(fingerprint)])
+
+    def _backfill(self, conn):
+        """
+        Index entries stored before the inverted index existed
+        """
+        indexed = {row[0] for row in conn.execute("SELECT entry_id FROM entries")}
+        for entry_id in self._entries():
+            if entry_id not in indexed:
+                with open(os.path.join(self.directory, f"{entry_id}.json"), encoding='utf-8') as f:
+                    info = json.load(f)['info']
+                self._index(conn, entry_id, np.load(os.path.join(self.directory, f"{entry_id}.npy")), info)
+
+    def _candidates(self, conn, fingerprint, recognition):
+        """
+        Up to MAX_CANDIDATES (entry_id, frame offset) pairs among entries
+        recognized with the given settings, with the most exactly matching
+        hashes at a single offset
+        """
+        with conn:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS query (hash INTEGER, frame INTEGER)")
+            conn.execute("DELETE FROM query")
+            conn.executemany("INSERT INTO query (hash, frame) VALUES (?, ?)", _indexable(fingerprint))
+            rows = conn.execute("""
+                SELECT entry_id, offset, MAX(votes) FROM (
+                    SELECT h.entry_id AS entry_id, h.frame - q.frame AS offset, COUNT(*) AS votes
+                    FROM query q JOIN hashes h ON h.hash = q.hash
+                    JOIN entries e ON e.entry_id = h.entry_id
+                    WHERE e.recognition = ?
+                    GROUP BY h.entry_id, offset
+                )
+                GROUP BY entry_id
+                ORDER BY MAX(votes) DESC
+                LIMIT ?
+            """, (_recognition_key(recognition), MAX_CANDIDATES)).fetchall()
+        return [(entry_id, offset) for entry_id, offset, _ in rows]
+
+    def add(self, fingerprint, words, info=None):
+        """
+        Store a fingerprint with its words as (word, start, end, speaker)
+
+        Args:
+            info: Entry metadata, including the recognition settings
+                (RECOGNITION_KEYS) the words were produced with
+
+        Returns:
+            Entry id (derived from the fingerprint and the recognition
+            settings, so re-adding is a no-op)
+        """
+        info = info or {}
+        os.makedirs(self.directory, exist_ok=True)
+        digest = hashlib.sha1(fingerprint.tobytes())
+        digest.update(_recognition_key(info).encode('utf-8'))
+        entry_id = digest.hexdigest()[:16]
+
+        np.save(os.path.join(self.directory, f"{entry_id}.npy"), fingerprint)
+        with open(os.path.join(self.directory, f"{entry_id}.json"), 'w', encoding='utf-8') as f:
+            json.dump({
+                'info': info,
+                'words': [[word, round(start, 2), round(end, 2), speaker]
+                          for word, start, end, speaker in words],
+            }, f, ensure_ascii=False)
+
+        conn = self._connect()
+        try:
+            self._index(conn, entry_id, fingerprint, info)
+        finally:
+            conn.close()
+
+        return entry_id
+
+    def _entries(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-4] for name in os.listdir(self.directory) if name.endswith('.npy'))
+
+    def find_match(self, fingerprint, recognition):
+        """
+        Find the longest stretch of fingerprint that matches a stored entry
+        recognized with the same settings
+
+        Args:
+            fingerprint: Fingerprint of the new recording
+            recognition: The new job's settings (RECOGNITION_KEYS); entries
+                recognized with other settings are never reused
+
+        Returns:
+            None, or a dict with:
+                entry_id: Matched entry
+                start, end: Matched range on the new recording (seconds)
+                offset: Stored time minus new time (seconds)
+                words: Stored words inside the range, shifted to new times
+        """
+        if not self._entries():
+            return None
+
+        conn = self._connect()
+        try:
+            self._backfill(conn)
+            candidates = self._candidates(conn, fingerprint, recognition)
+        finally:
+            conn.close()
+
+        min_frames = MIN_MATCH_SECONDS / FRAME_SECONDS
+        best = None
+
+        # Only entries sharing hashes with the query are loaded and scored
+        for entry_id, offset in candidates:
+            stored = np.load(os.path.join(self.directory, f"{entry_id}.npy"))
+            span = _longest_match(fingerprint, stored, offset)
+            if span is None or span[1] - span[0] < min_frames:
+                continue
+            if best is None or span[1] - span[0] > best[2] - best[1]:
+                best = (entry_id, span[0], span[1], offset)
+
+        if best is None:
+            return None
+
+        entry_id, start_frame, end_frame, offset_frames = best
+        start = start_frame * FRAME_SECONDS
+        end = end_frame * FRAME_SECONDS + FRAME_SIZE / FP_SAMPLE_RATE
+        offset = offset_frames * FRAME_SECONDS
+
+        with open(os.path.join(self.directory, f"{entry_id}.json"), encoding='utf-8') as f:
+            stored_words = json.load(f)['words']
+
+        # Only whole words inside the matched range are reused
+        words = [(word, word_start - offset, word_end - offset, speaker)
+                 for word, word_start, word_end, speaker in stored_words
+                 if word_start - offset >= start and word_end - offset <= end]
+        if not words:
+            return None
+
+        return {
+            'entry_id': entry_id,
+            'start': words[0][1],
+            'end': words[-1][2],
+            'offset': offset,
+            'words': words,
+        }
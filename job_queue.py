@@ -0,0 +1,740 @@
+"""
+Shared job queue for splitting the web tier from transcription workers
+
+The web app enqueues jobs, workers (worker.py) lease them, send heartbeats
+while they run and ack them when done. A lease that is not renewed expires
+and the job is handed to another worker (at-least-once delivery).
+
+Pending jobs are ordered by priority class (interactive before bulk),
+then fair share between submitters, then shortest expected job first
+(see JobQueue._order).
+
+Backends (selected by URL, see open_queue):
+    memory://                  - in-process stand-in, for tests and local runs
+    sqlite:///path/to/jobs.db  - single file shared by processes on one box
+    redis://host:6379/0        - any Redis-compatible server, for many boxes
+"""
+
+import json
+from abc import ABC, abstractmethod
+import sqlite3
+import threading
+import time
+
+# Seconds a worker owns a job without sending a heartbeat
+LEASE_SECONDS = 60
+
+# Deliveries before a job whose worker keeps disappearing is marked failed
+MAX_ATTEMPTS = 3
+
+# Priority classes, highest first
+PRIORITIES = ('interactive', 'bulk')
+
+# Bulk jobs waiting longer than this are scheduled as interactive, so a
+# steady stream of interactive jobs cannot starve them
+BULK_MAX_WAIT = 30 * 60
+
+# Assumed length (seconds) of jobs whose duration has not been probed yet
+DEFAULT_EXPECTED_DURATION = 10 * 60
+
+
+def slot_classes(slots, interactive_slots):
+    """
+    Priority classes each of `slots` job slots may lease
+
+    The first interactive_slots slots only take interactive jobs, so short
+    work never waits behind long bulk jobs; at least one slot takes any job.
+    """
+    reserved = max(0, min(interactive_slots, slots - 1))
+    return [('interactive',) if n < reserved else PRIORITIES for n in range(slots)]
+
+
+class WriteStats:
+    """
+    Job record writes: fields callers asked to store vs bytes the store wrote
+
+    write_bytes / update_bytes is the write amplification of a job store
+    (e.g. rewriting a whole record to change its progress field).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.updates = 0
+        self.update_bytes = 0
+        self.writes = 0
+        self.write_bytes = 0
+
+    def update(self, fields):
+        with self.lock:
+            self.updates += 1
+            self.update_bytes += len(json.dumps(fields, default=str))
+
+    def write(self, nbytes):
+        with self.lock:
+            self.writes += 1
+            self.write_bytes += nbytes
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'updates': self.updates,
+                'update_bytes': self.update_bytes,
+                'writes': self.writes,
+                'write_bytes': self.write_bytes,
+                'amplification': round(self.write_bytes / self.update_bytes, 2) if self.update_bytes else None,
+            }
+
+
+class JobQueue(ABC):
+    """
+    Common queue logic; backends implement the abstract storage primitives
+
+    Each job has a public record (what /status returns) and queue state:
+    its payload, state (pending / leased / done), owning worker, lease
+    expiry and attempt count.
+    """
+
+    def __init__(self, max_attempts=MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+        self.write_stats = WriteStats()
+
+    def enqueue(self, job_id, payload, record, priority='interactive', submitter='', expected_duration=None):
+        """
+        Add a job with its worker payload and initial public record
+
+        Args:
+            priority: One of PRIORITIES
+            submitter: Fair-share key (email or API key)
+            expected_duration: Probed audio length in seconds, if known
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        schedule = {'priority': priority, 'submitter': submitter, 'expected_duration': expected_duration}
+        self.write_stats.update(record)
+        self._insert(job_id, payload, record, schedule, time.time())
+
+    @abstractmethod
+    def set_expected_duration(self, job_id, seconds):
+        """
+        Record the probed duration of a pending job for shortest-job-first ordering
+        """
+
+    def lease(self, worker_id, lease_seconds=LEASE_SECONDS, classes=None):
+        """
+        Claim the next pending job for worker_id
+
+        Args:
+            classes: Only lease jobs submitted with one of these priorities
+                (e.g. ('interactive',) for a slot reserved for short work)
+
+        Returns:
+            (job_id, payload) or None if nothing is pending or leasing is
+            paused (see pause)
+        """
+        self.requeue_expired()
+        if self.paused_for():
+            return None
+        pending = self._pending()
+        if classes is not None:
+            pending = [job for job in pending if (job.get('priority') or 'interactive') in classes]
+        for job in self._order(pending):
+            if self._claim(job['job_id'], worker_id, time.time() + lease_seconds):
+                return job['job_id'], self._payload(job['job_id'])
+        return None
+
+    def pause(self, seconds):
+        """
+        Stop handing out jobs for the next `seconds` (e.g. after a job hit
+        API quota limits), for every worker sharing this queue
+        """
+        self._set_paused_until(max(self._paused_until(), time.time() + seconds))
+
+    def paused_for(self):
+        """
+        Seconds until leasing resumes (0 when not paused)
+        """
+        return max(0.0, self._paused_until() - time.time())
+
+    def requeue_expired(self):
+        """
+        Return jobs with expired leases to the queue, or fail them once
+        they have used up their attempts
+        """
+        now = time.time()
+        # Both steps re-check the expiry, so a heartbeat that lands after
+        # _expired() keeps the job with its worker
+        for job_id, attempts in self._expired(now):
+            if attempts >= self.max_attempts:
+                if self._finish(job_id, None, expired_before=now):
+                    self.update_job(job_id, status='failed',
+                                    error=f"Worker lost the job {attempts} times")
+            else:
+                self._requeue(job_id, now)
+
+    def _order(self, pending):
+        """
+        Order pending jobs for leasing
+
+        1. Priority class: interactive, then bulk (bulk jobs waiting longer
+           than BULK_MAX_WAIT count as interactive)
+        2. Fair share inside a class: a submitter's n-th shortest pending job
+           ranks behind every other submitter's (n-1)-th, counting jobs
+           they already have running, so one submitter's backlog cannot
+           starve the others
+        3. Shortest expected job first, then oldest first
+        """
+        now = time.time()
+        running = {}
+        for submitter in self._running_submitters():
+            running[submitter] = running.get(submitter, 0) + 1
+
+        def expected(job):
+            duration = job.get('expected_duration')
+            return DEFAULT_EXPECTED_DURATION if duration is None else duration
+
+        def priority_class(job):
+            priority = job.get('priority') or 'interactive'
+            if priority == 'bulk' and now - job['enqueued_at'] > BULK_MAX_WAIT:
+                priority = 'interactive'
+            return PRIORITIES.index(priority)
+
+        # Rank each submitter's jobs within a class, shortest first
+        rank = {}
+        position = {}
+        for job in sorted(pending, key=lambda job: (expected(job), job['enqueued_at'])):
+            submitter = job.get('submitter') or ''
+            key = (priority_class(job), submitter)
+            position[key] = position.get(key, running.get(submitter, 0)) + 1
+            rank[job['job_id']] = position[key]
+
+        return sorted(pending, key=lambda job: (
+            priority_class(job), rank[job['job_id']], expected(job), job['enqueued_at']))
+
+    @abstractmethod
+    def heartbeat(self, job_id, worker_id, lease_seconds=LEASE_SECONDS):
+        """
+        Extend the lease; returns False if worker_id no longer owns the job
+        """
+
+    def ack(self, job_id, worker_id):
+        """
+        Mark a leased job as done; returns False if the lease was lost
+        """
+        return self._finish(job_id, worker_id)
+
+    @abstractmethod
+    def get_job(self, job_id):
+        """
+        Public record of a job, or None
+        """
+
+    def update_job(self, job_id, **fields):
+        """
+        Merge fields into the public record of a job
+        """
+        self.write_stats.update(fields)
+        self._update_record(job_id, fields)
+
+    # Storage primitives
+
+    @abstractmethod
+    def _insert(self, job_id, payload, record, schedule, enqueued_at):
+        """
+        Store a new pending job (schedule: priority, submitter, expected_duration)
+        """
+
+    @abstractmethod
+    def _pending(self):
+        """
+        Pending jobs as dicts with job_id, enqueued_at and the schedule fields
+        """
+
+    @abstractmethod
+    def _running_submitters(self):
+        """
+        Submitter of every leased job (one entry per job)
+        """
+
+    @abstractmethod
+    def _claim(self, job_id, worker_id, lease_expires):
+        """
+        Atomically lease a pending job; returns False if it was taken first
+        """
+
+    @abstractmethod
+    def _payload(self, job_id):
+        """
+        Worker payload of a job
+        """
+
+    @abstractmethod
+    def _expired(self, now):
+        """
+        (job_id, attempts) of leased jobs whose lease expired before now
+        """
+
+    @abstractmethod
+    def _requeue(self, job_id, expired_before):
+        """
+        Return a leased job to pending if its lease expired before expired_before
+        """
+
+    @abstractmethod
+    def _finish(self, job_id, worker_id, expired_before=None):
+        """
+        Mark a leased job done; returns False if it is not leased, not owned
+        by worker_id (when given) or its lease did not expire before
+        expired_before (when given)
+        """
+
+    @abstractmethod
+    def _update_record(self, job_id, fields):
+        """
+        Merge fields into the stored public record
+        """
+
+    @abstractmethod
+    def _paused_until(self):
+        """
+        Time (epoch seconds) until which leasing is paused, 0 if never
+        """
+
+    @abstractmethod
+    def _set_paused_until(self, until):
+        """
+        Pause leasing until the given time (epoch seconds)
+        """
+
+
+class MemoryJobQueue(JobQueue):
+    """
+    In-process queue with the same semantics as the shared backends
+    """
+
+    def __init__(self, max_attempts=MAX_ATTEMPTS):
+        super().__init__(max_attempts)
+        self._lock = threading.Lock()
+        # Queue state of unfinished jobs, by state; finished jobs are dropped
+        # and only their public record is kept
+        self._pending_jobs = {}
+        self._leased_jobs = {}
+        self._records = {}
+        self._pause_until = 0.0
+
+    def _insert(self, job_id, payload, record, schedule, enqueued_at):
+        self.write_stats.write(len(json.dumps(record)))
+        with self._lock:
+            self._records[job_id] = dict(record)
+            self._pending_jobs[job_id] = dict(
+                schedule, job_id=job_id, payload=payload,
+                worker_id=None, lease_expires=0, attempts=0, enqueued_at=enqueued_at,
+            )
+
+    def _pending(self):
+        with self._lock:
+            return [dict(job) for job in self._pending_jobs.values()]
+
+    def _running_submitters(self):
+        with self._lock:
+            return [job['submitter'] for job in self._leased_jobs.values()]
+
+    def set_expected_duration(self, job_id, seconds):
+        with self._lock:
+            if job_id in self._pending_jobs:
+                self._pending_jobs[job_id]['expected_duration'] = seconds
+
+    def _claim(self, job_id, worker_id, lease_expires):
+        with self._lock:
+            job = self._pending_jobs.pop(job_id, None)
+            if job is None:
+                return False
+            job.update(worker_id=worker_id, lease_expires=lease_expires)
+            job['attempts'] += 1
+            self._leased_jobs[job_id] = job
+            return True
+
+    def _payload(self, job_id):
+        with self._lock:
+            job = self._leased_jobs.get(job_id) or self._pending_jobs[job_id]
+            return job['payload']
+
+    def _expired(self, now):
+        with self._lock:
+            return [(job['job_id'], job['attempts']) for job in self._leased_jobs.values()
+                    if job['lease_expires'] < now]
+
+    def _requeue(self, job_id, expired_before):
+        with self._lock:
+            job = self._leased_jobs.get(job_id)
+            if job and job['lease_expires'] < expired_before:
+                del self._leased_jobs[job_id]
+                job['worker_id'] = None
+                self._pending_jobs[job_id] = job
+
+    def _finish(self, job_id, worker_id, expired_before=None):
+        with self._lock:
+            job = self._leased_jobs.get(job_id)
+            if not job:
+                return False
+            if worker_id is not None and job['worker_id'] != worker_id:
+                return False
+            if expired_before is not None and job['lease_expires'] >= expired_before:
+                return False
+            del self._leased_jobs[job_id]
+            return True
+
+    def heartbeat(self, job_id, worker_id, lease_seconds=LEASE_SECONDS):
+        with self._lock:
+            job = self._leased_jobs.get(job_id)
+            if not job or job['worker_id'] != worker_id:
+                return False
+            job['lease_expires'] = time.time() + lease_seconds
+            return True
+
+    def get_job(self, job_id):
+        with self._lock:
+            record = self._records.get(job_id)
+            return dict(record) if record is not None else None
+
+    def _update_record(self, job_id, fields):
+        self.write_stats.write(len(json.dumps(fields)))
+        with self._lock:
+            self._records.setdefault(job_id, {}).update(fields)
+
+    def _paused_until(self):
+        return self._pause_until
+
+    def _set_paused_until(self, until):
+        self._pause_until = until
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    Queue stored in a single SQLite file, shared by all processes on a box
+    """
+
+    def __init__(self, path, max_attempts=MAX_ATTEMPTS):
+        super().__init__(max_attempts)
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    record TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    worker_id TEXT,
+                    lease_expires REAL NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    enqueued_at REAL NOT NULL,
+                    priority TEXT NOT NULL DEFAULT 'interactive',
+                    submitter TEXT NOT NULL DEFAULT '',
+                    expected_duration REAL
+                )
+            """)
+            # Queue files created before priority scheduling
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if 'priority' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN priority TEXT NOT NULL DEFAULT 'interactive'")
+                conn.execute("ALTER TABLE jobs ADD COLUMN submitter TEXT NOT NULL DEFAULT ''")
+                conn.execute("ALTER TABLE jobs ADD COLUMN expected_duration REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, enqueued_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS queue_state (name TEXT PRIMARY KEY, value REAL NOT NULL)")
+
+    def _connect(self):
+        # One connection per thread; sqlite3 connections are not thread-safe
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _insert(self, job_id, payload, record, schedule, enqueued_at):
+        record_json = json.dumps(record)
+        self.write_stats.write(len(record_json))
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, record, payload, state, enqueued_at, "
+                "priority, submitter, expected_duration) "
+                "VALUES (?, ?, ?, 'pending', ?, ?, ?, ?)",
+                (job_id, record_json, json.dumps(payload), enqueued_at,
+                 schedule['priority'], schedule['submitter'], schedule['expected_duration']))
+
+    def _pending(self):
+        rows = self._connect().execute(
+            "SELECT job_id, enqueued_at, priority, submitter, expected_duration "
+            "FROM jobs WHERE state = 'pending'").fetchall()
+        return [dict(row) for row in rows]
+
+    def _running_submitters(self):
+        rows = self._connect().execute(
+            "SELECT submitter FROM jobs WHERE state = 'leased'").fetchall()
+        return [row['submitter'] for row in rows]
+
+    def set_expected_duration(self, job_id, seconds):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET expected_duration = ? WHERE job_id = ?", (seconds, job_id))
+
+    def _claim(self, job_id, worker_id, lease_expires):
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = 'leased', worker_id = ?, lease_expires = ?, "
+                "attempts = attempts + 1 WHERE job_id = ? AND state = 'pending'",
+                (worker_id, lease_expires, job_id))
+            return cursor.rowcount == 1
+
+    def _payload(self, job_id):
+        row = self._connect().execute(
+            "SELECT payload FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row['payload'])
+
+    def _expired(self, now):
+        rows = self._connect().execute(
+            "SELECT job_id, attempts FROM jobs WHERE state = 'leased' AND lease_expires < ?",
+            (now,)).fetchall()
+        return [(row['job_id'], row['attempts']) for row in rows]
+
+    def _requeue(self, job_id, expired_before):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = 'pending', worker_id = NULL "
+                "WHERE job_id = ? AND state = 'leased' AND lease_expires < ?",
+                (job_id, expired_before))
+
+    def _finish(self, job_id, worker_id, expired_before=None):
+        sql = "UPDATE jobs SET state = 'done' WHERE job_id = ? AND state = 'leased'"
+        args = [job_id]
+        if worker_id is not None:
+            sql += " AND worker_id = ?"
+            args.append(worker_id)
+        if expired_before is not None:
+            sql += " AND lease_expires < ?"
+            args.append(expired_before)
+        with self._connect() as conn:
+            return conn.execute(sql, args).rowcount == 1
+
+    def heartbeat(self, job_id, worker_id, lease_seconds=LEASE_SECONDS):
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ? "
+                "WHERE job_id = ? AND state = 'leased' AND worker_id = ?",
+                (time.time() + lease_seconds, job_id, worker_id))
+            return cursor.rowcount == 1
+
+    def get_job(self, job_id):
+        row = self._connect().execute(
+            "SELECT record FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row['record']) if row else None
+
+    def _update_record(self, job_id, fields):
+        conn = self._connect()
+        # Read-modify-write under the database write lock
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT record FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is not None:
+                record = json.loads(row['record'])
+                record.update(fields)
+                # The whole record is rewritten for every field update
+                record_json = json.dumps(record)
+                self.write_stats.write(len(record_json))
+                conn.execute("UPDATE jobs SET record = ? WHERE job_id = ?",
+                             (record_json, job_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _paused_until(self):
+        row = self._connect().execute(
+            "SELECT value FROM queue_state WHERE name = 'paused_until'").fetchone()
+        return row['value'] if row else 0.0
+
+    def _set_paused_until(self, until):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO queue_state (name, value) VALUES ('paused_until', ?)", (until,))
+
+
+# Atomically move a job from the pending set to the leased set
+_REDIS_CLAIM = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 1 then
+    redis.call('ZADD', KEYS[2], ARGV[3], ARGV[1])
+    redis.call('HSET', KEYS[3], 'state', 'leased', 'worker_id', ARGV[2], 'lease_expires', ARGV[3])
+    redis.call('HINCRBY', KEYS[3], 'attempts', 1)
+    return 1
+end
+return 0
+"""
+
+# Extend a lease only if the caller still owns it
+_REDIS_HEARTBEAT = """
+if redis.call('HGET', KEYS[2], 'state') == 'leased' and redis.call('HGET', KEYS[2], 'worker_id') == ARGV[1] then
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[3])
+    redis.call('HSET', KEYS[2], 'lease_expires', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# Move a leased job to pending (ARGV[2] = 'pending') or done; an empty
+# ARGV[1] skips the owner check, a non-empty ARGV[4] only releases leases
+# that expired before that time
+_REDIS_RELEASE = """
+if redis.call('HGET', KEYS[2], 'state') ~= 'leased' then
+    return 0
+end
+if ARGV[1] ~= '' and redis.call('HGET', KEYS[2], 'worker_id') ~= ARGV[1] then
+    return 0
+end
+if ARGV[4] ~= '' and tonumber(redis.call('HGET', KEYS[2], 'lease_expires')) >= tonumber(ARGV[4]) then
+    return 0
+end
+redis.call('ZREM', KEYS[1], ARGV[3])
+redis.call('HSET', KEYS[2], 'state', ARGV[2])
+if ARGV[2] == 'pending' then
+    redis.call('ZADD', KEYS[3], redis.call('HGET', KEYS[2], 'enqueued_at'), ARGV[3])
+end
+return 1
+"""
+
+
+class RedisJobQueue(JobQueue):
+    """
+    Queue stored in a Redis-compatible server, shared by workers on many boxes
+
+    Keys (prefix "ytq:"):
+        pending         - sorted set of job ids by enqueue time
+        leased          - sorted set of job ids by lease expiry
+        job:<id>        - hash with queue state and JSON payload
+        record:<id>     - hash of public record fields (JSON values)
+    """
+
+    def __init__(self, client, prefix="ytq:", max_attempts=MAX_ATTEMPTS):
+        super().__init__(max_attempts)
+        self.redis = client
+        self.prefix = prefix
+        self._claim_script = client.register_script(_REDIS_CLAIM)
+        self._heartbeat_script = client.register_script(_REDIS_HEARTBEAT)
+        self._release_script = client.register_script(_REDIS_RELEASE)
+
+    def _key(self, *parts):
+        return self.prefix + ":".join(parts)
+
+    def _insert(self, job_id, payload, record, schedule, enqueued_at):
+        pipe = self.redis.pipeline()
+        pipe.hset(self._key('job', job_id), mapping={
+            'payload': json.dumps(payload), 'state': 'pending', 'worker_id': '',
+            'lease_expires': 0, 'attempts': 0, 'enqueued_at': enqueued_at,
+            'priority': schedule['priority'], 'submitter': schedule['submitter'],
+            'expected_duration': json.dumps(schedule['expected_duration']),
+        })
+        if record:
+            mapping = {k: json.dumps(v) for k, v in record.items()}
+            self.write_stats.write(sum(len(k) + len(v) for k, v in mapping.items()))
+            pipe.hset(self._key('record', job_id), mapping=mapping)
+        pipe.zadd(self._key('pending'), {job_id: enqueued_at})
+        pipe.execute()
+
+    def _pending(self):
+        pending = self.redis.zrange(self._key('pending'), 0, -1, withscores=True)
+        pipe = self.redis.pipeline()
+        for job_id, _ in pending:
+            pipe.hmget(self._key('job', _text(job_id)), 'priority', 'submitter', 'expected_duration')
+        jobs = []
+        for (job_id, score), (priority, submitter, expected) in zip(pending, pipe.execute()):
+            jobs.append({
+                'job_id': _text(job_id), 'enqueued_at': score,
+                'priority': _text(priority), 'submitter': _text(submitter) or '',
+                'expected_duration': json.loads(_text(expected)) if expected else None,
+            })
+        return jobs
+
+    def _running_submitters(self):
+        pipe = self.redis.pipeline()
+        for job_id in self.redis.zrange(self._key('leased'), 0, -1):
+            pipe.hget(self._key('job', _text(job_id)), 'submitter')
+        return [_text(submitter) or '' for submitter in pipe.execute()]
+
+    def set_expected_duration(self, job_id, seconds):
+        self.redis.hset(self._key('job', job_id), 'expected_duration', json.dumps(seconds))
+
+    def _paused_until(self):
+        return float(self.redis.get(self._key('paused_until')) or 0)
+
+    def _set_paused_until(self, until):
+        self.redis.set(self._key('paused_until'), until)
+
+    def _claim(self, job_id, worker_id, lease_expires):
+        keys = [self._key('pending'), self._key('leased'), self._key('job', job_id)]
+        return self._claim_script(keys=keys, args=[job_id, worker_id, lease_expires]) == 1
+
+    def _payload(self, job_id):
+        return json.loads(_text(self.redis.hget(self._key('job', job_id), 'payload')))
+
+    def _expired(self, now):
+        expired = []
+        for job_id in self.redis.zrangebyscore(self._key('leased'), '-inf', now):
+            job_id = _text(job_id)
+            attempts = self.redis.hget(self._key('job', job_id), 'attempts')
+            expired.append((job_id, int(attempts or 0)))
+        return expired
+
+    def _release(self, job_id, worker_id, state, expired_before=None):
+        keys = [self._key('leased'), self._key('job', job_id), self._key('pending')]
+        args = [worker_id or '', state, job_id, '' if expired_before is None else repr(expired_before)]
+        return self._release_script(keys=keys, args=args) == 1
+
+    def _requeue(self, job_id, expired_before):
+        self._release(job_id, None, 'pending', expired_before)
+
+    def _finish(self, job_id, worker_id, expired_before=None):
+        return self._release(job_id, worker_id, 'done', expired_before)
+
+    def heartbeat(self, job_id, worker_id, lease_seconds=LEASE_SECONDS):
+        keys = [self._key('leased'), self._key('job', job_id)]
+        args = [worker_id, time.time() + lease_seconds, job_id]
+        return self._heartbeat_script(keys=keys, args=args) == 1
+
+    def get_job(self, job_id):
+        fields = self.redis.hgetall(self._key('record', job_id))
+        if not fields:
+            return None
+        return {_text(k): json.loads(_text(v)) for k, v in fields.items()}
+
+    def _update_record(self, job_id, fields):
+        if fields:
+            mapping = {k: json.dumps(v) for k, v in fields.items()}
+            self.write_stats.write(sum(len(k) + len(v) for k, v in mapping.items()))
+            self.redis.hset(self._key('record', job_id), mapping=mapping)
+
+
+def _text(value):
+    """
+    Decode bytes returned by redis clients created without decode_responses
+    """
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+def open_queue(url):
+    """
+    Open a job queue from a URL (memory://, sqlite:///path, redis://...)
+    """
+    if url.startswith('memory://'):
+        return MemoryJobQueue()
+    if url.startswith('sqlite://'):
+        path = url[len('sqlite://'):]
+        # sqlite:///jobs.db -> jobs.db, sqlite:////var/lib/jobs.db -> /var/lib/jobs.db
+        if path.startswith('/'):
+            path = path[1:]
+        return SQLiteJobQueue(path or 'jobs.db')
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("Redis backend requires: pip install redis")
+        return RedisJobQueue(redis.Redis.from_url(url))
+    raise ValueError(f"Unsupported job queue URL: {url}")
@@ -0,0 +1,300 @@
+"""
+Load test for the web tier, driving the real Flask routes
+
+Virtual clients each submit a job to /transcribe and poll /status until it
+finishes, over and over, for a fixed duration. Transcription is done by
+fake_pipeline.py (tunable stage latencies and failure rates, see its
+docstring), so no network or credentials are needed.
+
+Reports request throughput, p50/p95/p99 latency per route, end-to-end job
+latency per priority, and the job store's write amplification (bytes
+written by the store / bytes of fields updated).
+
+Usage:
+    python loadtest.py [--clients N] [--duration SECONDS] [--poll-interval SECONDS]
+                       [--bulk-fraction F] [--submitters N]
+                       [--queue URL] [--workers N] [--url BASE_URL] [--verbose]
+
+Serving modes:
+    (default)        App imported in this process, local threads + jobs.pkl
+                     (--workers N overrides LOCAL_WORKERS)
+    --queue URL      Same, with JOB_QUEUE_URL=URL and worker.py's job slots
+                     in this process (--workers N overrides WORKER_SLOTS)
+                     (memory://, sqlite:///jobs.db, redis://...)
+    --url BASE_URL   An already running server, e.g.
+                     TRANSCRIBER_MODULE=fake_pipeline gunicorn app:app --workers 2
+                     (store writes happen in the server, so they are not reported)
+"""
+
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Seconds after the test duration that clients keep polling unfinished jobs
+DRAIN_SECONDS = 60
+
+# Seconds an idle in-process worker waits before polling the queue again
+WORKER_POLL_INTERVAL = 0.2
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of values (None if empty)
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.1f}"
+
+
+def _s(seconds):
+    return "-" if seconds is None else f"{seconds:.2f}"
+
+
+class Recorder:
+    """
+    Thread-safe collection of request and job timings
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.errors = {}
+        self.jobs = []
+
+    def request(self, route, seconds, ok):
+        with self.lock:
+            self.requests.setdefault(route, []).append(seconds)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+    def job(self, priority, status, seconds):
+        with self.lock:
+            self.jobs.append((priority, status, seconds))
+
+
+class LocalClient:
+    """
+    Calls the app in this process through Flask's test client
+    """
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def post(self, path, body):
+        response = self.client.post(path, json=body)
+        return response.status_code, response.get_json(silent=True) or {}
+
+    def get(self, path):
+        response = self.client.get(path)
+        return response.status_code, response.get_json(silent=True) or {}
+
+
+class HttpClient:
+    """
+    Calls a running server over HTTP
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def _send(self, request):
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.status, json.loads(response.read() or b'{}')
+        except urllib.error.HTTPError as e:
+            return e.code, {}
+        except (urllib.error.URLError, OSError, ValueError):
+            return 0, {}
+
+    def post(self, path, body):
+        return self._send(urllib.request.Request(
+            self.base_url + path, data=json.dumps(body).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}, method='POST'))
+
+    def get(self, path):
+        return self._send(urllib.request.Request(self.base_url + path))
+
+
+def run_client(client, recorder, deadline, options, client_number):
+    """
+    Submit a job, poll it to completion, repeat until the deadline
+    """
+    submitter = f"user{client_number % options['submitters']}@example.com"
+
+    while time.monotonic() < deadline:
+        priority = 'bulk' if random.random() < options['bulk_fraction'] else 'interactive'
+        body = {
+            'youtube_url': f"https://www.youtube.com/watch?v=load{client_number}",
+            'email': submitter,
+            'language': 'ta-IN',
+            'priority': priority,
+        }
+
+        submitted = time.monotonic()
+        status_code, response = client.post('/transcribe', body)
+        recorder.request('POST /transcribe', time.monotonic() - submitted, status_code == 200)
+        job_id = response.get('job_id')
+        if not job_id:
+            time.sleep(options['poll_interval'])
+            continue
+
+        status = 'unfinished'
+        while time.monotonic() < deadline + DRAIN_SECONDS:
+            time.sleep(options['poll_interval'])
+            start = time.monotonic()
+            status_code, job = client.get(f"/status/{job_id}")
+            recorder.request('GET /status', time.monotonic() - start, status_code == 200)
+            if job.get('status') in ('completed', 'failed'):
+                status = job['status']
+                break
+
+        recorder.job(priority, status, time.monotonic() - submitted)
+
+
+def worker_loop(queue, worker_id, classes, stop):
+    """
+    In-process stand-in for one of worker.py's slots (worker.slot_loop)
+    """
+    from worker import run_job
+
+    while not stop.is_set():
+        leased = queue.lease(worker_id, classes=classes)
+        if leased is None:
+            stop.wait(max(WORKER_POLL_INTERVAL, queue.paused_for()))
+            continue
+        job_id, payload = leased
+        run_job(queue, job_id, payload, worker_id)
+
+
+def print_report(recorder, elapsed, store_stats, mode):
+    print("=" * 72)
+    print(f"LOAD TEST REPORT ({mode}, {elapsed:.1f}s)")
+    print("=" * 72)
+
+    total = sum(len(timings) for timings in recorder.requests.values())
+    print(f"Requests: {total} ({total / elapsed:.1f} req/s)\n")
+
+    print(f"  {'route':<18} {'count':>7} {'errors':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for route, timings in sorted(recorder.requests.items()):
+        print(f"  {route:<18} {len(timings):>7} {recorder.errors.get(route, 0):>7} "
+              f"{len(timings) / elapsed:>8.1f} {_ms(percentile(timings, 50)):>9} "
+              f"{_ms(percentile(timings, 95)):>9} {_ms(percentile(timings, 99)):>9}")
+
+    print("\nJobs (end-to-end, submit to final status):")
+    print(f"  {'priority':<12} {'completed':>9} {'failed':>7} {'unfinished':>10} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8}")
+    for priority in sorted({job[0] for job in recorder.jobs}):
+        jobs = [job for job in recorder.jobs if job[0] == priority]
+        counts = {status: sum(1 for job in jobs if job[1] == status)
+                  for status in ('completed', 'failed', 'unfinished')}
+        done = [job[2] for job in jobs if job[1] != 'unfinished']
+        print(f"  {priority:<12} {counts['completed']:>9} {counts['failed']:>7} {counts['unfinished']:>10} "
+              + " ".join(f"{_s(percentile(done, pct)):>8}" for pct in (50, 95, 99)))
+
+    print("\nJob store writes:")
+    if store_stats is None:
+        print("  not available (store lives in the server process)")
+    else:
+        print(f"  field updates: {store_stats['updates']} ({store_stats['update_bytes']} bytes)")
+        print(f"  store writes:  {store_stats['writes']} ({store_stats['write_bytes']} bytes)")
+        print(f"  write amplification: {store_stats['amplification']}x")
+    print("=" * 72)
+
+
+def main():
+    def option(name, default, cast):
+        if name in sys.argv:
+            return cast(sys.argv[sys.argv.index(name) + 1])
+        return default
+
+    clients = option("--clients", 10, int)
+    duration = option("--duration", 30.0, float)
+    queue_url = option("--queue", "", str)
+    workers = option("--workers", None, int)
+    base_url = option("--url", "", str)
+    options = {
+        'poll_interval': option("--poll-interval", 0.5, float),
+        'bulk_fraction': option("--bulk-fraction", 0.2, float),
+        'submitters': option("--submitters", clients, int),
+    }
+    verbose = "--verbose" in sys.argv
+
+    recorder = Recorder()
+    stop = threading.Event()
+    workdir = None
+
+    if base_url:
+        mode = f"server at {base_url}"
+        make_client = lambda: HttpClient(base_url)
+        stats_source = None
+    else:
+        # The app writes jobs.pkl and results/ to the working directory
+        workdir = tempfile.TemporaryDirectory(ignore_cleanup_errors=True)
+        os.chdir(workdir.name)
+        sys.path.insert(0, REPO_DIR)
+        os.environ["TRANSCRIBER_MODULE"] = "fake_pipeline"
+        if workers is not None:
+            os.environ["LOCAL_WORKERS"] = str(workers)
+        if queue_url:
+            os.environ["JOB_QUEUE_URL"] = queue_url
+        else:
+            os.environ.pop("JOB_QUEUE_URL", None)
+
+        import app
+
+        make_client = lambda: LocalClient(app.app)
+        if app.job_queue:
+            import worker
+            from job_queue import slot_classes
+
+            slots = worker.WORKER_SLOTS if workers is None else workers
+            stats_source = app.job_queue.write_stats
+            # Same slot layout as worker.py, interactive slots reserved first
+            for n, classes in enumerate(slot_classes(max(1, slots), worker.INTERACTIVE_SLOTS)):
+                thread = threading.Thread(target=worker_loop, args=(app.job_queue, f"load-{n}", classes, stop))
+                thread.daemon = True
+                thread.start()
+            mode = f"in-process, queue {queue_url}, {slots} worker slot(s)"
+        else:
+            stats_source = app.store_stats
+            mode = f"in-process, local threads, {app.LOCAL_WORKERS} worker(s)"
+
+    print(f"[>>] {clients} clients for {duration:.0f}s against {mode}")
+
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    started = time.monotonic()
+    deadline = started + duration
+    with output:
+        threads = [threading.Thread(target=run_client, args=(make_client(), recorder, deadline, options, n))
+                   for n in range(clients)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.monotonic() - started
+    stop.set()
+
+    print_report(recorder, elapsed, stats_source.snapshot() if stats_source else None, mode)
+
+    if workdir:
+        os.chdir(REPO_DIR)
+        workdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
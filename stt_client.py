@@ -0,0 +1,322 @@
+"""
+Shared client layer for Google Speech-to-Text and Cloud Storage calls
+
+- One cached client per API, so gRPC channels / HTTP sessions are reused
+  within a transcriber process (one job)
+- Token-bucket rate limit per API (STT_SPEECH_RPS, STT_STORAGE_RPS),
+  shared by every process on this machine through a locked state file
+- Exponential-backoff retries on retryable errors (unavailable, deadline,
+  quota exhausted, ...)
+- A cap on concurrent long-running recognitions across all processes on
+  this machine (STT_MAX_CONCURRENT_OPS)
+- Counters (retries, quota errors, throttling, inline vs Cloud Storage
+  routing) printed as a [METRICS] line that app.py stores on the job and
+  the worker uses to back off
+"""
+
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+# Requests per second allowed for each API
+RATE_LIMITS = {
+    'speech': float(os.getenv("STT_SPEECH_RPS", "5")),
+    'storage': float(os.getenv("STT_STORAGE_RPS", "10")),
+}
+
+# Long-running recognitions allowed at once on this machine
+MAX_CONCURRENT_OPERATIONS = int(os.getenv("STT_MAX_CONCURRENT_OPS", "4"))
+
+# Retry schedule: BASE_DELAY * 2^attempt (+ jitter), capped at MAX_DELAY
+MAX_RETRIES = 5
+BASE_DELAY = 1.0
+MAX_DELAY = 32.0
+
+# google.api_core / requests exception names worth retrying; matched by
+# name so this module does not import the Google libraries at startup
+RETRYABLE_ERRORS = {
+    'ServiceUnavailable', 'DeadlineExceeded', 'InternalServerError',
+    'TooManyRequests', 'ResourceExhausted', 'Aborted', 'GatewayTimeout',
+    'BadGateway', 'ConnectionError', 'Timeout', 'ReadTimeout',
+}
+
+# Errors meaning the project quota is used up
+QUOTA_ERRORS = {'ResourceExhausted', 'TooManyRequests'}
+
+metrics = {
+    'calls': 0,
+    'retries': 0,
+    'quota_exhausted': 0,
+    # Calls that still failed with a quota error after every retry
+    'quota_failures': 0,
+    'throttled_seconds': 0.0,
+    'operation_wait_seconds': 0.0,
+    # Recognition routing: inline (synchronous) vs staged through Cloud Storage
+    'route_inline': 0,
+    'route_gcs': 0,
+    'inline_seconds': 0.0,
+    'gcs_seconds': 0.0,
+}
+_metrics_lock = threading.Lock()
+
+
+def _count(name, amount=1):
+    with _metrics_lock:
+        metrics[name] += amount
+
+
+class TokenBucket:
+    """
+    Token bucket allowing `rate` calls per second with bursts up to `capacity`
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take one token, sleeping until one is available; returns seconds waited
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class _FileTokenBucket(TokenBucket):
+    """
+    Token bucket whose state (tokens, last refill) lives in a file, so all
+    processes on the machine (one per job) draw from the same bucket
+    """
+
+    def __init__(self, rate, path, capacity=None):
+        super().__init__(rate, capacity)
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def acquire(self):
+        import fcntl
+
+        waited = 0.0
+        while True:
+            with self.lock, open(self.path, 'a+') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                f.seek(0)
+                try:
+                    tokens, updated = json.loads(f.read())
+                except ValueError:
+                    tokens, updated = self.capacity, time.time()
+
+                now = time.time()
+                tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+                delay = 0.0
+                if tokens >= 1:
+                    tokens -= 1
+                else:
+                    delay = (1 - tokens) / self.rate
+
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps([tokens, now]))
+                f.flush()
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+            if not delay:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_speech_client():
+    """
+    Shared SpeechClient (one gRPC channel per process)
+    """
+    with _clients_lock:
+        if 'speech' not in _clients:
+            from google.cloud import speech_v1p1beta1 as speech
+            _clients['speech'] = speech.SpeechClient()
+        return _clients['speech']
+
+
+def get_storage_client():
+    """
+    Shared Cloud Storage client (one HTTP session per process)
+    """
+    with _clients_lock:
+        if 'storage' not in _clients:
+            from google.cloud import storage
+            _clients['storage'] = storage.Client()
+        return _clients['storage']
+
+
+def is_retryable(error):
+    return type(error).__name__ in RETRYABLE_ERRORS
+
+
+def call_with_retry(api, func, *args, **kwargs):
+    """
+    Call func under the rate limit for `api`, retrying retryable errors
+    with exponential backoff
+
+    Args:
+        api: 'speech' or 'storage'
+        func: Callable making the API request
+    """
+    bucket = _buckets[api]
+    for attempt in range(MAX_RETRIES + 1):
+        _count('throttled_seconds', bucket.acquire())
+        _count('calls')
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            name = type(e).__name__
+            if name in QUOTA_ERRORS:
+                _count('quota_exhausted')
+            if not is_retryable(e) or attempt == MAX_RETRIES:
+                if name in QUOTA_ERRORS:
+                    _count('quota_failures')
+                raise
+            delay = min(MAX_DELAY, BASE_DELAY * 2 ** attempt) * random.uniform(0.5, 1.5)
+            print(f"[!] {api} call failed ({name}: {e}); retrying in {delay:.1f}s")
+            _count('retries')
+            time.sleep(delay)
+
+
+class _ThreadSlots:
+    """
+    Fallback operation cap for platforms without fcntl (per process only)
+    """
+
+    def __init__(self, count):
+        self.semaphore = threading.BoundedSemaphore(count)
+
+    @contextmanager
+    def hold(self):
+        with self.semaphore:
+            yield
+
+
+class _FileSlots:
+    """
+    Operation cap shared by every process on the machine: one lock file
+    per slot, and holding a slot means holding its exclusive flock
+    """
+
+    def __init__(self, count, directory):
+        self.count = count
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def hold(self):
+        import fcntl
+
+        while True:
+            for slot in range(self.count):
+                f = open(os.path.join(self.directory, f"slot-{slot}.lock"), 'w')
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    f.close()
+                    continue
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                    f.close()
+                return
+            time.sleep(1)
+
+
+try:
+    import fcntl  # noqa: F401
+    _slots = _FileSlots(MAX_CONCURRENT_OPERATIONS,
+                        os.path.join(tempfile.gettempdir(), "stt-operation-slots"))
+    _buckets = {api: _FileTokenBucket(rate, os.path.join(tempfile.gettempdir(), "stt-rate-limits", f"{api}.json"))
+                for api, rate in RATE_LIMITS.items()}
+except ImportError:
+    _slots = _ThreadSlots(MAX_CONCURRENT_OPERATIONS)
+    _buckets = {api: TokenBucket(rate) for api, rate in RATE_LIMITS.items()}
+
+
+@contextmanager
+def operation_slot():
+    """
+    Wait for one of the MAX_CONCURRENT_OPERATIONS long-running operation slots
+    """
+    start = time.monotonic()
+    with _slots.hold():
+        _count('operation_wait_seconds', time.monotonic() - start)
+        yield
+
+
+def run_operation(api, start, *args, timeout=600, **kwargs):
+    """
+    Start a long-running operation and wait for its result, retrying
+    retryable failures with a new operation each time (a finished
+    Operation raises the same error on every result() call)
+
+    The operation slot is held only while an attempt runs, not during the
+    backoff between attempts.
+
+    Args:
+        api: 'speech' or 'storage'
+        start: Callable returning an api_core Operation
+        timeout: Seconds to wait for each operation's result
+    """
+    def attempt():
+        with operation_slot():
+            return start(*args, **kwargs).result(timeout=timeout)
+
+    return call_with_retry(api, attempt)
+
+
+def record_route(route, seconds):
+    """
+    Count one recognition sent by `route` ('inline' or 'gcs') and its latency
+    """
+    _count(f'route_{route}')
+    _count(f'{route}_seconds', seconds)
+
+
+def print_metrics():
+    """
+    Print the counters as one machine-readable line for app.py to collect
+    """
+    with _metrics_lock:
+        snapshot = {name: round(value, 3) if isinstance(value, float) else value
+                    for name, value in metrics.items()}
+    print(f"[METRICS] {json.dumps(snapshot)}")
+
+
+def parse_metrics(output):
+    """
+    Return the last [METRICS] dict found in a transcriber's stdout, or {}
+    """
+    for line in reversed(output.splitlines()):
+        if line.startswith("[METRICS] "):
+            try:
+                return json.loads(line[len("[METRICS] "):])
+            except ValueError:
+                return {}
+    return {}
@@ -0,0 +1,284 @@
+"""
+Tests for job_queue, run against every backend (memory, SQLite, fakeredis)
+"""
+
+import time
+
+import pytest
+
+import job_queue
+from job_queue import open_queue
+
+# Lease length for tests that let a lease run out
+SHORT_LEASE = 0.01
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'redis'])
+def queue(request, tmp_path):
+    if request.param == 'memory':
+        return open_queue('memory://')
+    if request.param == 'sqlite':
+        return open_queue(f"sqlite:///{tmp_path / 'jobs.db'}")
+    fakeredis = pytest.importorskip('fakeredis')
+    return job_queue.RedisJobQueue(fakeredis.FakeRedis())
+
+
+def expire(queue, job_id, worker_id='w1'):
+    """
+    Lease job_id with a lease that has already run out
+    """
+    assert queue.lease(worker_id, lease_seconds=SHORT_LEASE) == (job_id, {'n': 1})
+    time.sleep(SHORT_LEASE * 5)
+
+
+def test_enqueue_lease_ack(queue):
+    queue.enqueue('j1', {'n': 1}, {'status': 'queued'})
+    assert queue.get_job('j1') == {'status': 'queued'}
+
+    assert queue.lease('w1') == ('j1', {'n': 1})
+    assert queue.lease('w2') is None
+
+    queue.update_job('j1', status='completed', progress=100)
+    assert queue.get_job('j1') == {'status': 'completed', 'progress': 100}
+
+    assert not queue.ack('j1', 'w2')
+    assert queue.ack('j1', 'w1')
+    assert not queue.ack('j1', 'w1')
+    assert queue.lease('w1') is None
+
+
+def test_heartbeat_only_for_owner(queue):
+    queue.enqueue('j1', {'n': 1}, {})
+    queue.lease('w1')
+    assert queue.heartbeat('j1', 'w1')
+    assert not queue.heartbeat('j1', 'w2')
+
+
+def test_expired_lease_is_redelivered(queue):
+    queue.enqueue('j1', {'n': 1}, {})
+    expire(queue, 'j1')
+
+    assert queue.lease('w2') == ('j1', {'n': 1})
+    # The first worker lost the job
+    assert not queue.heartbeat('j1', 'w1')
+    assert not queue.ack('j1', 'w1')
+    assert queue.ack('j1', 'w2')
+
+
+def test_fails_after_max_attempts(queue):
+    queue.max_attempts = 2
+    queue.enqueue('j1', {'n': 1}, {'status': 'queued'})
+    expire(queue, 'j1', 'w1')
+    expire(queue, 'j1', 'w2')
+
+    assert queue.lease('w3') is None
+    job = queue.get_job('j1')
+    assert job['status'] == 'failed'
+    assert '2 times' in job['error']
+
+
+def test_heartbeat_racing_requeue_keeps_job(queue, monkeypatch):
+    queue.enqueue('j1', {'n': 1}, {})
+    expire(queue, 'j1')
+
+    # The worker's heartbeat lands after _expired() but before the requeue
+    expired = queue._expired
+
+    def expired_then_heartbeat(now):
+        found = expired(now)
+        assert queue.heartbeat('j1', 'w1', 60)
+        return found
+
+    monkeypatch.setattr(queue, '_expired', expired_then_heartbeat)
+    queue.requeue_expired()
+    monkeypatch.undo()
+
+    assert queue.lease('w2') is None
+    assert queue.ack('j1', 'w1')
+
+
+def test_heartbeat_racing_final_failure_keeps_job(queue, monkeypatch):
+    queue.max_attempts = 1
+    queue.enqueue('j1', {'n': 1}, {'status': 'queued'})
+    expire(queue, 'j1')
+
+    expired = queue._expired
+
+    def expired_then_heartbeat(now):
+        found = expired(now)
+        assert queue.heartbeat('j1', 'w1', 60)
+        return found
+
+    monkeypatch.setattr(queue, '_expired', expired_then_heartbeat)
+    queue.requeue_expired()
+    monkeypatch.undo()
+
+    assert queue.get_job('j1') == {'status': 'queued'}
+    assert queue.ack('j1', 'w1')
+
+
+def test_pause_stops_leasing(queue):
+    queue.enqueue('j1', {'n': 1}, {})
+    queue.pause(0.2)
+
+    assert queue.paused_for() > 0
+    assert queue.lease('w1') is None
+
+    time.sleep(0.25)
+    assert queue.paused_for() == 0
+    assert queue.lease('w1') == ('j1', {'n': 1})
+
+
+def test_pause_never_shortens(queue):
+    queue.pause(60)
+    queue.pause(1)
+    assert queue.paused_for() > 30
+
+
+def test_backend_missing_primitive_fails_on_creation():
+    class Incomplete(job_queue.JobQueue):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_run_job_updates_and_acks(queue, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import app
+    import worker
+
+    def fake_transcription(job_id, update_job, **payload):
+        update_job(job_id, status='completed', url=payload['youtube_url'])
+
+    monkeypatch.setattr(app, 'run_transcription', fake_transcription)
+    queue.enqueue('j1', {'youtube_url': 'u'}, {'status': 'queued'})
+    job_id, payload = queue.lease('w1')
+    worker.run_job(queue, job_id, payload, 'w1')
+
+    assert queue.get_job('j1') == {'status': 'completed', 'url': 'u'}
+    # Acked: neither leasable nor owned any more
+    assert queue.lease('w2') is None
+    assert not queue.heartbeat('j1', 'w1')
+
+
+@pytest.mark.parametrize('status, metrics, paused', [
+    ('completed', {'quota_exhausted': 1, 'quota_failures': 0}, False),
+    ('failed', {'quota_exhausted': 0, 'quota_failures': 0}, False),
+    ('failed', {'quota_exhausted': 6, 'quota_failures': 1}, True),
+])
+def test_run_job_pauses_only_on_quota_failure(queue, tmp_path, monkeypatch, status, metrics, paused):
+    monkeypatch.chdir(tmp_path)
+    import app
+    import worker
+
+    def fake_transcription(job_id, update_job, **payload):
+        update_job(job_id, metrics=metrics)
+        update_job(job_id, status=status)
+
+    monkeypatch.setattr(app, 'run_transcription', fake_transcription)
+    queue.enqueue('j1', {}, {})
+    job_id, payload = queue.lease('w1')
+    worker.run_job(queue, job_id, payload, 'w1')
+
+    assert (queue.paused_for() > 0) == paused
+
+
+def test_memory_queue_drops_finished_jobs():
+    queue = open_queue('memory://')
+    queue.max_attempts = 1
+    queue.enqueue('j1', {'n': 1}, {'status': 'queued'})
+    queue.enqueue('j2', {'n': 1}, {'status': 'queued'})
+    queue.lease('w1')
+    queue.ack('j1', 'w1')
+    expire(queue, 'j2')
+    queue.requeue_expired()
+
+    assert not queue._pending_jobs and not queue._leased_jobs
+    # Public records outlive the queue state
+    assert queue.get_job('j1') == {'status': 'queued'}
+    assert queue.get_job('j2')['status'] == 'failed'
+
+
+@pytest.mark.parametrize('slots, interactive_slots, expected', [
+    (2, 1, [('interactive',), ('interactive', 'bulk')]),
+    (3, 0, [('interactive', 'bulk')] * 3),
+    # At least one slot always takes bulk jobs
+    (1, 1, [('interactive', 'bulk')]),
+    (2, 5, [('interactive',), ('interactive', 'bulk')]),
+])
+def test_slot_classes(slots, interactive_slots, expected):
+    assert job_queue.slot_classes(slots, interactive_slots) == expected
+
+
+def leased_order(queue):
+    """
+    Job ids in the order queue hands them out
+    """
+    order = []
+    leased = queue.lease('w1')
+    while leased is not None:
+        order.append(leased[0])
+        leased = queue.lease('w1')
+    return order
+
+
+def test_interactive_before_bulk(queue):
+    queue.enqueue('bulk', {}, {}, priority='bulk')
+    queue.enqueue('interactive', {}, {}, priority='interactive')
+    assert leased_order(queue) == ['interactive', 'bulk']
+
+
+def test_classes_restrict_lease(queue):
+    queue.enqueue('bulk', {}, {}, priority='bulk')
+    assert queue.lease('w1', classes=('interactive',)) is None
+    assert queue.lease('w1', classes=job_queue.PRIORITIES) == ('bulk', {})
+
+
+def test_shortest_job_first(queue):
+    queue.enqueue('long', {}, {}, expected_duration=3600)
+    queue.enqueue('unknown', {}, {})
+    queue.enqueue('short', {}, {}, expected_duration=60)
+    assert leased_order(queue) == ['short', 'unknown', 'long']
+
+
+def test_set_expected_duration_reorders(queue):
+    queue.enqueue('a', {}, {}, expected_duration=60)
+    queue.enqueue('b', {}, {}, expected_duration=120)
+    queue.set_expected_duration('b', 30)
+    assert leased_order(queue) == ['b', 'a']
+
+
+def test_fair_share_between_submitters(queue):
+    for n in range(3):
+        queue.enqueue(f"alice{n}", {}, {}, submitter='alice', expected_duration=60)
+    queue.enqueue('bob0', {}, {}, submitter='bob', expected_duration=600)
+    assert leased_order(queue) == ['alice0', 'bob0', 'alice1', 'alice2']
+
+
+def test_fair_share_counts_running_jobs(queue):
+    queue.enqueue('alice0', {}, {}, submitter='alice', expected_duration=60)
+    assert queue.lease('w1') == ('alice0', {})
+    queue.enqueue('alice1', {}, {}, submitter='alice', expected_duration=60)
+    queue.enqueue('bob0', {}, {}, submitter='bob', expected_duration=600)
+    assert leased_order(queue) == ['bob0', 'alice1']
+
+
+def test_old_bulk_job_promoted(queue, monkeypatch):
+    queue.enqueue('bulk', {}, {}, priority='bulk', expected_duration=60)
+    monkeypatch.setattr(job_queue, 'BULK_MAX_WAIT', 0)
+    time.sleep(0.01)
+    queue.enqueue('interactive', {}, {}, priority='interactive', expected_duration=600)
+    # Scheduled as interactive, and shorter
+    assert leased_order(queue) == ['bulk', 'interactive']
+
+
+def test_order_promotes_bulk_after_max_wait(queue):
+    now = time.time()
+    pending = [
+        {'job_id': 'fresh', 'priority': 'bulk', 'enqueued_at': now, 'expected_duration': 60},
+        {'job_id': 'stale', 'priority': 'bulk', 'enqueued_at': now - job_queue.BULK_MAX_WAIT - 1,
+         'expected_duration': 600},
+        {'job_id': 'interactive', 'priority': 'interactive', 'enqueued_at': now, 'expected_duration': 300},
+    ]
+    assert [job['job_id'] for job in queue._order(pending)] == ['interactive', 'stale', 'fresh']
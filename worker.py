@@ -0,0 +1,119 @@
+"""
+Transcription worker - pulls jobs from the shared queue set in JOB_QUEUE_URL
+
+Run one or more of these next to (or on other machines than) the web app:
+    JOB_QUEUE_URL=redis://host:6379/0 python worker.py
+
+Each worker runs WORKER_SLOTS jobs at a time (each in its own directory),
+INTERACTIVE_SLOTS of them reserved for interactive jobs, and renews every
+lease with heartbeats.
+Jobs are leased interactive before bulk, fairly across submitters and
+shortest first (see job_queue.JobQueue._order).
+If a worker dies, its lease expires and another worker gets the job.
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+
+from job_queue import open_queue, slot_classes, LEASE_SECONDS
+
+# Seconds to wait before polling an empty queue again
+POLL_INTERVAL = 2
+
+# Seconds the queue is paused after a job failed on exhausted API quotas
+QUOTA_BACKOFF = 60
+
+# Jobs run at once by this worker, and how many of those slots only take
+# interactive jobs (so short clips never wait behind hours of bulk work)
+WORKER_SLOTS = int(os.getenv("WORKER_SLOTS", "2"))
+INTERACTIVE_SLOTS = int(os.getenv("INTERACTIVE_SLOTS", "1"))
+
+
+def heartbeat_loop(queue, job_id, worker_id, stop):
+    """
+    Renew the lease every third of LEASE_SECONDS until stop is set
+    """
+    while not stop.wait(LEASE_SECONDS / 3):
+        if not queue.heartbeat(job_id, worker_id, LEASE_SECONDS):
+            print(f"[!] Lost lease on job {job_id}; it may be redelivered")
+            return
+
+
+def run_job(queue, job_id, payload, worker_id, update_job=None):
+    """
+    Run one leased job, keeping its lease alive while it runs
+
+    update_job defaults to the queue's own records; the web app's local
+    mode passes its job store instead
+    """
+    # Imported here so the worker does not need the web app at startup
+    from app import run_transcription
+
+    update_job = update_job or queue.update_job
+    quota_failures = [0]
+
+    # Pause as soon as the job fails because the quota stayed exhausted
+    # through every retry; quota errors that a retry got past do not count
+    def update(job_id, **fields):
+        quota_failures[0] += (fields.get('metrics') or {}).get('quota_failures', 0)
+        update_job(job_id, **fields)
+        if fields.get('status') == 'failed' and quota_failures[0]:
+            print(f"[!] Job {job_id} failed on API quota limits; pausing the queue {QUOTA_BACKOFF}s")
+            queue.pause(QUOTA_BACKOFF)
+
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=heartbeat_loop, args=(queue, job_id, worker_id, stop))
+    heartbeat.daemon = True
+    heartbeat.start()
+
+    try:
+        run_transcription(job_id, update_job=update, **payload)
+    finally:
+        stop.set()
+        heartbeat.join()
+
+    if not queue.ack(job_id, worker_id):
+        print(f"[!] Job {job_id} finished after its lease expired")
+
+
+def slot_loop(queue, worker_id, classes):
+    """
+    Lease and run jobs of the given priority classes, one at a time
+    """
+    while True:
+        leased = queue.lease(worker_id, LEASE_SECONDS, classes=classes)
+        if leased is None:
+            time.sleep(max(POLL_INTERVAL, queue.paused_for()))
+            continue
+
+        job_id, payload = leased
+        print(f"[>>] Running job {job_id} ({worker_id})")
+        run_job(queue, job_id, payload, worker_id)
+
+
+def main():
+    url = os.getenv("JOB_QUEUE_URL")
+    if not url:
+        print("[ERR] Set JOB_QUEUE_URL, e.g. sqlite:///jobs.db or redis://localhost:6379/0")
+        sys.exit(1)
+
+    queue = open_queue(url)
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    print(f"[OK] Worker {worker_id} polling {url} with {WORKER_SLOTS} slot(s)")
+
+    slots = []
+    for n, classes in enumerate(slot_classes(max(1, WORKER_SLOTS), INTERACTIVE_SLOTS)):
+        slot = threading.Thread(target=slot_loop, args=(queue, f"{worker_id}-{n}", classes))
+        slot.daemon = True
+        slot.start()
+        slots.append(slot)
+
+    for slot in slots:
+        slot.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,15 @@
 import os
 import sys
-from google.cloud import speech_v1p1beta1 as speech
-from pydub import AudioSegment
 import io
 import time
+import contextlib
+from types import SimpleNamespace
+
+import stt_client
+from audio_buffer import AudioBuffer, AUDIO_SPILL_BYTES
+
+# google.cloud.speech and pydub take seconds to import, so they are
+# imported inside the functions that use them; printing usage stays fast
 
 # ============================================
 # SET YOUR GOOGLE CREDENTIALS PATH HERE
@@ -11,7 +17,77 @@ import time
 GOOGLE_CREDENTIALS_PATH = "C:/Users/aryap/Downloads/credentials.json"  # Update this path
 # ============================================
 
-def extract_audio(youtube_url, output_path="audio.wav", compress=False):
+# Languages offered by the web app, also used as candidates for --language auto
+SUPPORTED_LANGUAGES = [
+    "ta-IN", "en-US", "hi-IN", "te-IN", "ml-IN", "kn-IN",
+    "mr-IN", "bn-IN", "gu-IN", "pa-IN", "ur-IN",
+]
+
+# Speech-to-Text accepts at most 3 alternative language codes per request
+MAX_ALTERNATIVE_LANGUAGES = 3
+
+# Length of the slice sampled for automatic language detection
+DETECT_SAMPLE_SECONDS = 15
+
+# Speaker count range passed to diarization (callers can override)
+DEFAULT_MIN_SPEAKERS = 2
+DEFAULT_MAX_SPEAKERS = 2
+
+# Pause (seconds) after which the same speaker starts a new turn
+MAX_TURN_GAP = 2.0
+
+# Synchronous recognize() limits for inline audio content; longer audio
+# is staged in Cloud Storage and sent to long_running_recognize()
+INLINE_MAX_SECONDS = 60
+INLINE_MAX_BYTES = 10 * 1024 * 1024
+
+# Unmatched audio shorter than this is not sent for recognition when the
+# rest of the recording is reused from the fingerprint index
+MIN_GAP_SECONDS = 1.0
+
+# How yt-dlp presents itself to YouTube (shared by download and probe)
+YDL_CLIENT_OPTIONS = {
+    'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'referer': 'https://www.youtube.com/',
+    'extractor_args': {
+        'youtube': {
+            'player_client': ['android', 'web'],
+            'player_skip': ['webpage', 'configs'],
+        }
+    },
+}
+
+# Network timeout (seconds) for probing a video's metadata
+PROBE_TIMEOUT = 20
+
+def probe_duration(youtube_url):
+    """
+    Look up a video's length without downloading it
+    
+    Args:
+        youtube_url: YouTube video URL
+    
+    Returns:
+        Duration in seconds, or None if it could not be determined
+    """
+    try:
+        import yt_dlp
+        
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'skip_download': True,
+            'socket_timeout': PROBE_TIMEOUT,
+            **YDL_CLIENT_OPTIONS,
+        }
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(youtube_url, download=False)
+        return info.get('duration') or None
+    except Exception as e:
+        print(f"[!] Could not probe duration of {youtube_url}: {e}")
+        return None
+
+def extract_audio(youtube_url, output_path="audio.wav", compress=False, with_fingerprint=False, in_memory=False):
     """
     Extract audio from YouTube video and convert to WAV format
     Uses yt-dlp for better reliability on cloud servers
@@ -20,15 +96,21 @@ def extract_audio(youtube_url, output_path="audio.wav", compress=False):
         youtube_url: URL of the YouTube video
         output_path: Path where audio file will be saved
         compress: If True, compress to stay under 10MB
+        with_fingerprint: If True, also fingerprint the converted audio
+            (see fingerprint.py) while it is still in memory
+        in_memory: If True, keep audio up to AUDIO_SPILL_BYTES in memory and
+            return an AudioBuffer instead of writing output_path
     
     Returns:
-        Path to the extracted audio file and duration
+        Path to the extracted audio file (or AudioBuffer) and duration
+        (plus the fingerprint, or None if it failed, when with_fingerprint is set)
     """
     try:
         print(f"[>>] Downloading audio from: {youtube_url}")
         print("This may take a few minutes...")
         
         import yt_dlp
+        from pydub import AudioSegment
         
         # yt-dlp options for audio download
         ydl_opts = {
@@ -37,14 +119,7 @@ def extract_audio(youtube_url, output_path="audio.wav", compress=False):
             'quiet': False,
             'no_warnings': False,
             'extract_audio': True,
-            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'referer': 'https://www.youtube.com/',
-            'extractor_args': {
-                'youtube': {
-                    'player_client': ['android', 'web'],
-                    'player_skip': ['webpage', 'configs'],
-                }
-            },
+            **YDL_CLIENT_OPTIONS,
             'postprocessors': [{
                 'key': 'FFmpegExtractAudio',
                 'preferredcodec': 'wav',
@@ -83,18 +158,37 @@ def extract_audio(youtube_url, output_path="audio.wav", compress=False):
         else:
             audio = audio.set_frame_rate(16000)  # 16kHz for quality
         
-        audio.export(output_path, format="wav")
+        # Short clips stay in memory; everything downstream reads slices
+        # of the same samples (see audio_buffer.py)
+        audio_buffer = AudioBuffer.from_segment(audio)
+        if in_memory and len(audio_buffer) <= AUDIO_SPILL_BYTES:
+            result = audio_buffer
+        else:
+            audio.export(output_path, format="wav")
+            result = output_path
+        
+        fp = None
+        if with_fingerprint:
+            try:
+                from fingerprint import compute_fingerprint
+                fp = compute_fingerprint(audio_buffer.samples(), audio.frame_rate)
+            except Exception as fp_error:
+                print(f"[!] Could not fingerprint audio: {fp_error}")
         
         # Clean up temp files
         if os.path.exists(temp_file):
             os.remove(temp_file)
         
-        file_size = os.path.getsize(output_path)
-        print(f"[OK] Audio extracted to: {output_path}")
+        if isinstance(result, AudioBuffer):
+            print(f"[OK] Audio kept in memory")
+        else:
+            print(f"[OK] Audio extracted to: {output_path}")
         print(f"  Duration: {duration//60}:{duration%60:02d} minutes")
-        print(f"  File size: {file_size / (1024*1024):.2f} MB")
+        print(f"  File size: {len(audio_buffer) / (1024*1024):.2f} MB")
         
-        return output_path, duration
+        if with_fingerprint:
+            return result, duration, fp
+        return result, duration
         
     except Exception as e:
         print(f"[ERR] Error extracting audio: {e}")
@@ -102,102 +196,255 @@ def extract_audio(youtube_url, output_path="audio.wav", compress=False):
         traceback.print_exc()
         sys.exit(1)
 
-def transcribe_google_stt(audio_path, language_code="ta-IN"):
+def detect_language(audio_path, candidates=None, sample_seconds=DETECT_SAMPLE_SECONDS):
+    """
+    Detect the spoken language from a short slice of the audio
+    Runs synchronous recognition on the slice with each group of
+    candidates (1 primary + up to 3 alternatives) and keeps the
+    language that recognized the most confident speech
+
+    Args:
+        audio_path: Path to audio file, or an AudioBuffer
+        candidates: Language codes to choose from (default: SUPPORTED_LANGUAGES)
+        sample_seconds: Length of the sampled slice in seconds
+
+    Returns:
+        Detected language code, or the first candidate if nothing was recognized
+    """
+    from google.cloud import speech_v1p1beta1 as speech
+
+    candidates = list(candidates or SUPPORTED_LANGUAGES)
+
+    print(f"\n[>>] Detecting language from a {sample_seconds}s sample...")
+
+    with opened_audio(audio_path) as audio_buffer:
+        # Skip intro music/silence: sample from 10% in, but never past 30s
+        start = min(30, audio_buffer.duration / 10)
+        sample = audio_buffer.slice(start, start + sample_seconds)
+        sample_rate = sample.sample_rate
+
+        # Inline content must be bytes: the only copy is of the sample itself
+        audio = speech.RecognitionAudio(content=bytes(sample.data))
+        sample.close()
+
+    client = stt_client.get_speech_client()
+
+    scores = {}
+    group_size = MAX_ALTERNATIVE_LANGUAGES + 1
+    for i in range(0, len(candidates), group_size):
+        group = candidates[i:i + group_size]
+        config = speech.RecognitionConfig(
+            encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+            sample_rate_hertz=sample_rate,
+            language_code=group[0],
+            alternative_language_codes=group[1:],
+        )
+        response = stt_client.call_with_retry('speech', client.recognize, config=config, audio=audio)
+
+        for result in response.results:
+            if not result.alternatives:
+                continue
+            alternative = result.alternatives[0]
+            # Results report lower-case codes (e.g. "ta-in")
+            code = _match_language(result.language_code, group) or group[0]
+            words = len(alternative.transcript.split())
+            scores[code] = scores.get(code, 0) + words * (alternative.confidence or 0.5)
+
+    if not scores:
+        print(f"[!] No speech recognized in sample, falling back to {candidates[0]}")
+        return candidates[0]
+
+    detected = max(scores, key=scores.get)
+    print(f"[OK] Detected language: {detected}")
+    return detected
+
+def as_audio_buffer(audio_path):
+    """
+    AudioBuffer for a WAV path (memory-mapped) or an existing AudioBuffer
+    The caller closes it when done
+    """
+    if isinstance(audio_path, AudioBuffer):
+        return audio_path
+    return AudioBuffer.open_wav(audio_path)
+
+@contextlib.contextmanager
+def opened_audio(audio_path):
+    """
+    Like as_audio_buffer, but a WAV path is unmapped again on exit;
+    an existing AudioBuffer is left open for its owner
+    """
+    if isinstance(audio_path, AudioBuffer):
+        yield audio_path
+        return
+    audio_buffer = AudioBuffer.open_wav(audio_path)
+    try:
+        yield audio_buffer
+    finally:
+        audio_buffer.close()
+
+def _match_language(code, candidates):
+    """
+    Map a language code reported by the API back to a candidate code
+    """
+    if not code:
+        return None
+    code = code.lower()
+    for candidate in candidates:
+        if candidate.lower() == code:
+            return candidate
+    # Fall back to matching the base language ("ta" for "ta-IN")
+    for candidate in candidates:
+        if candidate.split("-")[0].lower() == code.split("-")[0]:
+            return candidate
+    return None
+
+def transcribe_google_stt(audio_path, language_code="ta-IN", alternative_language_codes=None,
+                          min_speakers=DEFAULT_MIN_SPEAKERS, max_speakers=DEFAULT_MAX_SPEAKERS):
     """
     Transcribe audio using Google Speech-to-Text API
     Automatically detects sample rate from audio file
     
     Args:
-        audio_path: Path to audio file
+        audio_path: Path to audio file, or an AudioBuffer of LINEAR16 samples
         language_code: Language code (ta-IN for Tamil India)
+        alternative_language_codes: Up to 3 extra language codes for
+            mixed-language audio; each result reports the language it used
+        min_speakers: Fewest speakers diarization should assume
+        max_speakers: Most speakers diarization should assume
     
     Returns:
         Google Speech-to-Text response
     """
+    alternative_language_codes = [
+        code for code in (alternative_language_codes or []) if code != language_code
+    ][:MAX_ALTERNATIVE_LANGUAGES]
+
     try:
+        from google.cloud import speech_v1p1beta1 as speech
+        
         print(f"\n{'='*60}")
         print("[>>] Transcribing with Google Cloud Speech-to-Text...")
         print(f"{'='*60}")
         
+        # In-memory audio is uploaded straight from its buffer
+        audio_buffer = audio_path if isinstance(audio_path, AudioBuffer) else None
+        
         # Check file size
-        file_size = os.path.getsize(audio_path)
+        file_size = len(audio_buffer) if audio_buffer else os.path.getsize(audio_path)
         file_size_mb = file_size / (1024 * 1024)
         
         print(f"File size: {file_size_mb:.2f} MB")
         
-        # Detect sample rate from audio file
-        audio_segment = AudioSegment.from_wav(audio_path)
-        sample_rate = audio_segment.frame_rate
+        # Detect sample rate (from the WAV header only, not the whole file)
+        if audio_buffer:
+            sample_rate = audio_buffer.sample_rate
+            audio_seconds = audio_buffer.duration
+        else:
+            import wave
+            with wave.open(audio_path, 'rb') as wav:
+                sample_rate = wav.getframerate()
+                audio_seconds = wav.getnframes() / sample_rate
         print(f"Detected sample rate: {sample_rate} Hz")
         
-        client = speech.SpeechClient()
+        client = stt_client.get_speech_client()
         
         # Configure recognition settings with detected sample rate
         config = speech.RecognitionConfig(
             encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
             sample_rate_hertz=sample_rate,  # Use detected rate
             language_code=language_code,
+            alternative_language_codes=alternative_language_codes,
             enable_automatic_punctuation=True,
             enable_word_time_offsets=True,
             model="latest_long",
             use_enhanced=True,
-            enable_speaker_diarization=True,
-            diarization_speaker_count=2,
+            diarization_config=speech.SpeakerDiarizationConfig(
+                enable_speaker_diarization=True,
+                min_speaker_count=min_speakers,
+                max_speaker_count=max(min_speakers, max_speakers),
+            ),
         )
         
-        print(f"Language: Tamil (ta-IN)")
+        print(f"Language: {language_code}")
+        if alternative_language_codes:
+            print(f"Alternative languages: {', '.join(alternative_language_codes)}")
         print(f"Model: latest_long (Enhanced)")
-        print(f"Features: Speaker diarization, Punctuation, Timestamps")
+        print(f"Features: Speaker diarization ({min_speakers}-{max(min_speakers, max_speakers)} speakers), Punctuation, Timestamps")
+        
+        # Google Cloud Speech has a ~60 second / 10MB limit for inline audio
+        # Short clips skip Cloud Storage (bucket, upload, polling, cleanup)
+        if audio_seconds <= INLINE_MAX_SECONDS and file_size <= INLINE_MAX_BYTES:
+            print(f"\n[!] Short clip ({audio_seconds:.0f}s): using inline recognition")
+            started = time.time()
+            with opened_audio(audio_path) as inline:
+                audio = speech.RecognitionAudio(content=bytes(inline.data))
+            response = stt_client.call_with_retry('speech', client.recognize, config=config, audio=audio)
+            stt_client.record_route('inline', time.time() - started)
+            
+            print(f"[OK] Transcription completed successfully!")
+            return response
         
-        # Google Cloud Speech has a ~60 second limit for inline audio
         # For anything longer, we MUST use Cloud Storage
-        # File size limit is 10MB for inline, but duration is the real constraint
-        
-        # Always use Cloud Storage for safety (videos are usually > 1 min)
         print(f"\n[!] Using Google Cloud Storage for transcription...")
         print("This is required for videos longer than 1 minute.")
         
         try:
-            from google.cloud import storage
             import uuid
             
-            # Create storage client
-            storage_client = storage.Client()
+            started = time.time()
+            
+            # Shared storage client (reuses its HTTP session)
+            storage_client = stt_client.get_storage_client()
             
             # Create a unique bucket name using UUID
             unique_id = str(uuid.uuid4())[:8]
             bucket_name = f"speech-transcription-{unique_id}"
             
             try:
-                bucket = storage_client.get_bucket(bucket_name)
+                bucket = stt_client.call_with_retry('storage', storage_client.get_bucket, bucket_name)
             except:
                 print(f"Creating bucket: {bucket_name}")
-                bucket = storage_client.create_bucket(bucket_name, location="us")
+                bucket = stt_client.call_with_retry('storage', storage_client.create_bucket, bucket_name, location="us")
             
             # Upload file
             blob_name = f"audio_{int(time.time())}.wav"
             blob = bucket.blob(blob_name)
             
-            print(f"[>>] Uploading to Cloud Storage...")
-            blob.upload_from_filename(audio_path)
-            
-            gcs_uri = f"gs://{bucket_name}/{blob_name}"
-            print(f"[OK] Uploaded to: {gcs_uri}")
-            
-            # Use GCS URI for transcription
-            audio = speech.RecognitionAudio(uri=gcs_uri)
-            
-            print("\n[...] Processing transcription...")
-            operation = client.long_running_recognize(config=config, audio=audio)
-            response = operation.result(timeout=600)
-            
-            # Clean up
-            print("[!] Cleaning up Cloud Storage...")
-            blob.delete()
             try:
-                bucket.delete()
-            except:
-                pass
+                print(f"[>>] Uploading to Cloud Storage...")
+                if audio_buffer:
+                    # Raw LINEAR16 samples; a fresh reader per attempt so retries start over
+                    stt_client.call_with_retry(
+                        'storage',
+                        lambda: blob.upload_from_file(audio_buffer.reader(), size=len(audio_buffer),
+                                                      content_type='application/octet-stream'),
+                    )
+                else:
+                    stt_client.call_with_retry('storage', blob.upload_from_filename, audio_path)
+                
+                gcs_uri = f"gs://{bucket_name}/{blob_name}"
+                print(f"[OK] Uploaded to: {gcs_uri}")
+                
+                # Use GCS URI for transcription
+                audio = speech.RecognitionAudio(uri=gcs_uri)
+                
+                # Runs in a free operation slot so bursts stay under the
+                # operation quota; a failed operation is started again
+                print("\n[...] Processing transcription...")
+                response = stt_client.run_operation('speech', client.long_running_recognize,
+                                                    config=config, audio=audio, timeout=600)
+                stt_client.record_route('gcs', time.time() - started)
+            finally:
+                # Clean up, even if recognition failed
+                print("[!] Cleaning up Cloud Storage...")
+                try:
+                    stt_client.call_with_retry('storage', blob.delete)
+                except:
+                    pass
+                try:
+                    stt_client.call_with_retry('storage', bucket.delete)
+                except:
+                    pass
             
         except ImportError:
             print("\n[ERR] google-cloud-storage not installed")
@@ -229,26 +476,139 @@ def transcribe_google_stt(audio_path, language_code="ta-IN"):
         traceback.print_exc()
         sys.exit(1)
 
-def save_transcription(response, output_file="tamil_transcription.txt"):
+def diarized_words(response):
+    """
+    Recognized words as (word, start, end, speaker) tuples
+    
+    Args:
+        response: Google Speech-to-Text response
+    
+    Returns:
+        List of words in time order (speaker 0 = unknown)
+    """
+    # With diarization on, the last result repeats every word of the audio
+    # with its speaker tag; earlier results carry speaker_tag 0
+    word_infos = []
+    if response.results and response.results[-1].alternatives:
+        last_words = response.results[-1].alternatives[0].words
+        if any(word_info.speaker_tag for word_info in last_words):
+            word_infos = last_words
+    if not word_infos:
+        for result in response.results:
+            if result.alternatives:
+                word_infos.extend(result.alternatives[0].words)
+    
+    return [
+        (word_info.word, word_info.start_time.total_seconds(),
+         word_info.end_time.total_seconds(), word_info.speaker_tag)
+        for word_info in word_infos
+    ]
+
+def collapse_turns(words, max_gap=MAX_TURN_GAP):
+    """
+    Collapse (word, start, end, speaker) tuples into speaker turns in a single pass
+    
+    Args:
+        words: Words in time order, as returned by diarized_words
+        max_gap: Pause in seconds after which the same speaker starts a new turn
+    
+    Returns:
+        List of turns: {'speaker', 'start', 'end', 'text'} (speaker 0 = unknown)
+    """
+    turns = []
+    current = None
+    for word, start_time, end_time, speaker in words:
+        if current and current['speaker'] == speaker and start_time - current['end'] <= max_gap:
+            current['words'].append(word)
+            current['end'] = end_time
+        else:
+            current = {'speaker': speaker, 'start': start_time, 'end': end_time, 'words': [word]}
+            turns.append(current)
+    
+    for turn in turns:
+        turn['text'] = " ".join(turn.pop('words'))
+    
+    return turns
+
+def build_speaker_turns(response, max_gap=MAX_TURN_GAP):
+    """
+    Collapse the diarized words of a response into speaker turns
+    """
+    return collapse_turns(diarized_words(response), max_gap)
+
+def format_speaker_turn(turn):
+    """
+    Format one speaker turn as a single transcript line
+    """
+    speaker = f"Speaker {turn['speaker']}" if turn['speaker'] else "Speaker ?"
+    return f"[{turn['start']:>7.2f}s - {turn['end']:>7.2f}s] {speaker}: {turn['text']}"
+
+def uncovered_ranges(audio_path, match):
+    """
+    Ranges (start, end) in seconds of the audio outside a fingerprint match
+    that are long enough to be worth recognizing
+    """
+    with opened_audio(audio_path) as audio_buffer:
+        total = audio_buffer.duration
+    
+    ranges = [(0, match['start']), (match['end'], total)]
+    return [(start, end) for start, end in ranges if end - start >= MIN_GAP_SECONDS]
+
+def transcribe_with_reuse(audio_path, match, **stt_options):
+    """
+    Transcribe only the audio not covered by a fingerprint match
+    Words from the matched transcript are reused with shifted timestamps;
+    the audio before and after the matched range is recognized separately
+    
+    Args:
+        audio_path: Path to audio file, or an AudioBuffer
+        match: Result of FingerprintIndex.find_match
+        stt_options: Passed to transcribe_google_stt
+    
+    Returns:
+        Merged (word, start, end, speaker) tuples and the responses for the new parts
+    """
+    words = list(match['words'])
+    responses = []
+    with opened_audio(audio_path) as audio_buffer:
+        for start, end in uncovered_ranges(audio_buffer, match):
+            print(f"\n[>>] Recognizing new audio {start:.1f}s - {end:.1f}s")
+            # Each piece is a view of the same samples, not a new file
+            response = transcribe_google_stt(audio_buffer.slice(start, end), **stt_options)
+            
+            responses.append(response)
+            words.extend((word, word_start + start, word_end + start, speaker)
+                         for word, word_start, word_end, speaker in diarized_words(response))
+    
+    words.sort(key=lambda word: word[1])
+    return words, responses
+
+def save_transcription(response, output_file="tamil_transcription.txt", turns=None):
     """
     Save Google STT transcription to file with detailed information
     
     Args:
         response: Google Speech-to-Text response
         output_file: Output file path
+        turns: Speaker turns from build_speaker_turns (built if not given);
+            when given, the full transcription is built from the turns since
+            they may include text reused from an earlier transcript
     """
     try:
+        full_transcript = ""
+        if turns is None:
+            turns = build_speaker_turns(response)
+            for result in response.results:
+                full_transcript += result.alternatives[0].transcript + " "
+        else:
+            full_transcript = " ".join(turn['text'] for turn in turns)
+        
         with open(output_file, 'w', encoding='utf-8') as f:
             # Write header
             f.write("="*60 + "\n")
             f.write("TAMIL TRANSCRIPTION - Google Cloud Speech-to-Text\n")
             f.write("="*60 + "\n\n")
             
-            # Collect full transcript
-            full_transcript = ""
-            for result in response.results:
-                full_transcript += result.alternatives[0].transcript + " "
-            
             # Write full transcription
             f.write("="*60 + "\n")
             f.write("FULL TRANSCRIPTION:\n")
@@ -256,7 +616,14 @@ def save_transcription(response, output_file="tamil_transcription.txt"):
             f.write(full_transcript.strip())
             f.write("\n\n")
             
-            # Write detailed results with confidence and timing
+            # Write one line per speaker turn instead of one per word
+            f.write("="*60 + "\n")
+            f.write("SPEAKER TURNS:\n")
+            f.write("="*60 + "\n\n")
+            f.write("\n".join(format_speaker_turn(turn) for turn in turns))
+            f.write("\n\n")
+            
+            # Write detailed results with confidence and language
             f.write("="*60 + "\n")
             f.write("DETAILED SEGMENTS:\n")
             f.write("="*60 + "\n\n")
@@ -267,25 +634,13 @@ def save_transcription(response, output_file="tamil_transcription.txt"):
                 f.write(f"\n--- Segment {i+1} ---\n")
                 f.write(f"Transcript: {alternative.transcript}\n")
                 f.write(f"Confidence: {alternative.confidence:.2%}\n")
-                
-                # Write word-level timestamps if available
-                if hasattr(alternative, 'words') and alternative.words:
-                    f.write("\nWord timings:\n")
-                    for word_info in alternative.words:
-                        word = word_info.word
-                        start_time = word_info.start_time.total_seconds()
-                        end_time = word_info.end_time.total_seconds()
-                        
-                        # Check for speaker tag
-                        speaker = ""
-                        if hasattr(word_info, 'speaker_tag'):
-                            speaker = f" [Speaker {word_info.speaker_tag}]"
-                        
-                        f.write(f"  [{start_time:>7.2f}s - {end_time:>7.2f}s]: {word}{speaker}\n")
+                if result.language_code:
+                    f.write(f"Language: {result.language_code}\n")
                 
                 f.write("\n")
         
         print(f"\n[OK] Transcription saved to: {output_file}")
+        print(f"  Speaker turns: {len(turns)}")
         
         # Calculate average confidence
         confidences = [result.alternatives[0].confidence for result in response.results if result.alternatives[0].confidence > 0]
@@ -300,14 +655,18 @@ def save_transcription(response, output_file="tamil_transcription.txt"):
     except Exception as e:
         print(f"[ERR] Error saving transcription: {e}")
 
-def display_preview(response):
+def display_preview(response, turns=None):
     """
     Display a preview of the transcription
+    (built from turns instead of the response when turns are given)
     """
     try:
         full_text = ""
-        for result in response.results:
-            full_text += result.alternatives[0].transcript + " "
+        if turns is not None:
+            full_text = " ".join(turn['text'] for turn in turns)
+        else:
+            for result in response.results:
+                full_text += result.alternatives[0].transcript + " "
         
         print("\n" + "="*60)
         print("[PREVIEW] TRANSCRIPTION PREVIEW:")
@@ -340,11 +699,20 @@ def main():
         print("  python script.py https://www.youtube.com/watch?v=xxxxx")
         print("  python script.py https://www.youtube.com/watch?v=xxxxx --language en-US")
         print("  python script.py https://www.youtube.com/watch?v=xxxxx --language ta-IN --compress")
+        print("  python script.py https://www.youtube.com/watch?v=xxxxx --language auto")
+        print("  python script.py https://www.youtube.com/watch?v=xxxxx --language ta-IN --alt-languages en-US")
         print("\nOptions:")
         print("  --language LANG : Language code (default: ta-IN)")
         print("                    ta-IN (Tamil), en-US (English), hi-IN (Hindi)")
         print("                    te-IN (Telugu), ml-IN (Malayalam), etc.")
+        print("                    auto = detect from a short sample first")
+        print("  --alt-languages L1,L2 : Up to 3 extra languages for mixed-language audio")
+        print("  --min-speakers N : Fewest speakers for diarization (default: 2)")
+        print("  --max-speakers N : Most speakers for diarization (default: 2)")
         print("  --compress      : Compress audio to stay under 10MB (lower quality)")
+        print("  --no-dedup      : Do not reuse transcripts of previously seen audio")
+        print("  --in-memory     : Keep short clips in memory instead of writing a WAV")
+        print("                    (spills to disk above AUDIO_SPILL_MB, default 10)")
         print("\nSetup Required:")
         print("  1. Install: pip install google-cloud-speech google-cloud-storage yt-dlp pydub")
         print("  2. Create Google Cloud project")
@@ -363,6 +731,12 @@ def main():
     
     youtube_url = sys.argv[1]
     compress = "--compress" in sys.argv
+    dedup = "--no-dedup" not in sys.argv
+    in_memory = "--in-memory" in sys.argv
+    
+    # Report API retry/quota counters on exit, including failed runs
+    import atexit
+    atexit.register(stt_client.print_metrics)
     
     # Get language from command line arguments
     language_code = "ta-IN"  # Default to Tamil
@@ -371,7 +745,30 @@ def main():
         if lang_index + 1 < len(sys.argv):
             language_code = sys.argv[lang_index + 1]
     
+    # Extra languages for code-mixed audio, e.g. --alt-languages en-US,hi-IN
+    alternative_language_codes = []
+    if "--alt-languages" in sys.argv:
+        alt_index = sys.argv.index("--alt-languages")
+        if alt_index + 1 < len(sys.argv):
+            alternative_language_codes = [
+                code.strip() for code in sys.argv[alt_index + 1].split(",") if code.strip()
+            ]
+    
+    # Speaker count range for diarization
+    min_speakers = DEFAULT_MIN_SPEAKERS
+    max_speakers = DEFAULT_MAX_SPEAKERS
+    if "--min-speakers" in sys.argv:
+        index = sys.argv.index("--min-speakers")
+        if index + 1 < len(sys.argv):
+            min_speakers = int(sys.argv[index + 1])
+    if "--max-speakers" in sys.argv:
+        index = sys.argv.index("--max-speakers")
+        if index + 1 < len(sys.argv):
+            max_speakers = int(sys.argv[index + 1])
+    
     print(f"Language: {language_code}")
+    if alternative_language_codes:
+        print(f"Alternative languages: {', '.join(alternative_language_codes)}")
     
     # Set Google credentials
     # First, check for secret file (most secure - Render)
@@ -413,7 +810,12 @@ def main():
     # Extract audio from YouTube
     audio_file = "tamil_audio.wav"
     try:
-        audio_path, duration = extract_audio(youtube_url, audio_file, compress=compress)
+        fp = None
+        if dedup:
+            audio_path, duration, fp = extract_audio(youtube_url, audio_file, compress=compress,
+                                                     with_fingerprint=True, in_memory=in_memory)
+        else:
+            audio_path, duration = extract_audio(youtube_url, audio_file, compress=compress, in_memory=in_memory)
         
         if compress:
             print("\n[!] Note: Audio was compressed. Accuracy may be slightly reduced.")
@@ -434,20 +836,75 @@ def main():
         sys.exit(1)
     
     # Transcribe audio
-    if os.path.exists(audio_file):
+    if isinstance(audio_path, AudioBuffer) or os.path.exists(audio_path):
+        # Opened (mapped) once; every stage below reads views of it
+        audio_buffer = None
         try:
-            response = transcribe_google_stt(audio_file, language_code=language_code)
+            audio_buffer = as_audio_buffer(audio_path)
+            
+            # Detected first: earlier transcripts are only reused when they
+            # were recognized in the same language
+            if language_code == "auto":
+                language_code = detect_language(audio_buffer)
+                # Code-mixed speech is most often mixed with English
+                if not alternative_language_codes and language_code != "en-US":
+                    alternative_language_codes = ["en-US"]
+            
+            stt_options = {
+                'language_code': language_code,
+                'alternative_language_codes': alternative_language_codes,
+                'min_speakers': min_speakers,
+                'max_speakers': max_speakers,
+            }
+            
+            # Settings a reused transcript must have been recognized with
+            # (speaker tags are only comparable within the same range)
+            recognition = {
+                'language': language_code,
+                'alternative_languages': sorted(alternative_language_codes),
+                'min_speakers': min_speakers,
+                'max_speakers': max_speakers,
+            }
+            
+            # Re-uploads and mirrors of audio we already transcribed
+            index = None
+            match = None
+            if fp is not None and len(fp):
+                from fingerprint import FingerprintIndex
+                index = FingerprintIndex()
+                match = index.find_match(fp, recognition)
+                if match:
+                    print(f"\n[OK] Audio {match['start']:.1f}s - {match['end']:.1f}s matches an earlier transcript ({match['entry_id']})")
+            
+            covered = bool(match) and not uncovered_ranges(audio_buffer, match)
+            
+            if match:
+                words, responses = transcribe_with_reuse(audio_buffer, match, **stt_options)
+                turns = collapse_turns(words)
+                # Detailed segments only exist for the newly recognized parts
+                response = SimpleNamespace(results=[result for r in responses for result in r.results])
+            else:
+                response = transcribe_google_stt(audio_buffer, **stt_options)
+                words = diarized_words(response)
+                turns = None
+            
+            # Remember this audio unless it was entirely reused
+            if index is not None and words and not covered:
+                index.add(fp, words, dict(recognition, youtube_url=youtube_url))
             
             # Display preview
-            display_preview(response)
+            display_preview(response, turns)
             
             # Save complete transcription
-            save_transcription(response, "tamil_transcription.txt")
+            save_transcription(response, "tamil_transcription.txt", turns)
             
             print("\n" + "="*60)
             print("[SUCCESS] COMPLETED SUCCESSFULLY!")
             print("="*60)
-            print(f"[FILE] Audio file: {audio_file}")
+            if isinstance(audio_path, AudioBuffer):
+                print(f"[FILE] Audio file: (kept in memory)")
+            else:
+                print(f"[FILE] Audio file: {audio_path}")
             print(f"[FILE] Transcription file: tamil_transcription.txt")
             print(f"[TIME] Duration: {duration//60}:{duration%60:02d} minutes")
             print(f"[COST] Estimated cost: ${cost:.3f}")
@@ -456,6 +913,9 @@ def main():
         except Exception as e:
             print(f"\n[ERR] Transcription failed: {e}")
             sys.exit(1)
+        finally:
+            if audio_buffer is not None:
+                audio_buffer.close()
     else:
         print(f"[ERR] Error: Audio file not found")
         sys.exit(1)